@@ -1,11 +1,21 @@
 import os
 from src.config.config import Config
 from src.logging.app_logger import AppLogger
+from src.api.request_utils import RequestUtils
 from src.service.scraper import Scraper
+from src.service.distributed_service import DistributedService
 from src.service.boxscore_service import BoxscoreService
 from src.service.playbyplay_service import PlaybyplayService
+from src.service.scoring_run_service import ScoringRunService
+from src.service.game_state_service import GameStateService
+from src.service.ratings_service import RatingsService
+from src.service.play_type_service import PlayTypeService
+from src.service.stint_service import StintService
+from src.service.watch_service import WatchService
+from src.service.live_playbyplay_service import LivePlaybyplayService
 from src.service.freethrow_service import FreethrowService
 from src.service.end_3qtr_service import End3QtrService
+from src.service.significance_service import SignificanceService
 from src.service.file_service import FileService
 
 
@@ -18,18 +28,56 @@ class App(object):
 
         logger = AppLogger.set_up_logger("app.log")
         config = Config.set_up_config(".env")
+        AppLogger.configure(config)
+        RequestUtils.set_up_transport(config)
 
         Scraper(config).scrape()
+        # or the same scrape + parse spread over queue workers
+        DistributedService(config).run()
+        RequestUtils.shut_down_transport()
 
         # build the boxscore data
         BoxscoreService(config).collect_boxscore_data()
          
         PlaybyplayService(config).collect_playbyplay_data()
 
+        # scoring runs, lead changes, ties, largest lead for every game
+        ScoringRunService(config).collect_scoring_runs()
+
+        # play types, possessions, pace and FT trips for every game
+        PlayTypeService(config).classify_playbyplay()
+
+        # five-player lineups over time and the plus-minus of each
+        StintService(config).build_stints()
+        # StintService(config).net_points([4433516, 4433622]) # these two on the floor together
+
+        # score at any point on the game clock, for clutch-time queries
+        GameStateService(config).build_game_state()
+        # GameStateService(config).games_within(3, 120) # within 3 in the last 2 minutes
+
+        # opponent-adjusted offensive / defensive efficiency for every team in the boxscore files
+        RatingsService(config).collect_ratings()
+        # RatingsService(config).print_ratings("2025")
+
+        # keep running, picking up each game as it goes final
+        WatchService(config).watch()
+
+        # follow one game while it is being played
+        # LivePlaybyplayService(config).tail("401725001")
+
+        # season rollups
+        # FreethrowService(config).season_ft_report()
+        # End3QtrService(config).quarter_margin_report("q3")
+
         # analyze FT percentages, losses 5 points or less
         # FreethrowService(config).analyze_close_game_ft_percentages("L")
         # FreethrowService(config).analyze_close_game_ft_percentages("W")
 
+        # is close-loss FT% really different? permutation p-values and bootstrap intervals
+        # SignificanceService(config).analyze("FT")
+
         End3QtrService(config).analyze_after_3_quarters("L")
 
-App.go()
\ No newline at end of file
+# spawned map-reduce workers import this module again, which must not re-run the pipeline
+if __name__ == "__main__":
+    App.go()
@@ -11,18 +11,18 @@ class ApiUtils(object):
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
-            logger.info(str(response.text))
+            logger.info(str(response.text[:AppLogger.max_message_length()]))
             # logger.info(str(response.url))
             logger.info(str(response))
             logger.info(str(response.__attrs__))
             logger.info(str(response.reason))
-            logger.info(str(response._content))
             logger.info(str(response.reason))
             logger.info(str(response.request.__class__))
             raise
 
     @classmethod
-    def debug(cls, response):
+    def debug(cls, response, streamed:bool = False):
+        # streamed: the body hasn't been read (and is about to go to a file), so only its headers
         logger = AppLogger.get_logger()
 
         #logger.info(str(response.text))
@@ -30,8 +30,10 @@ class ApiUtils(object):
         logger.info(str(response))
         logger.info(str(response.__attrs__))
         logger.info(str(response.reason))
-        logger.info(str(response._content))
-        logger.info(str(response.reason))
+        if streamed:
+            logger.info(str(response.headers))
+        else:
+            logger.info(str(response.content[:AppLogger.max_message_length()]))
         logger.info(str(response.request.__class__))
 
   
\ No newline at end of file
@@ -0,0 +1,134 @@
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from src.api.transport import ArchiveUtils
+from src.logging.app_logger import AppLogger
+
+class ReplayServer(object):
+    # local stand-in for espn.com: serves a recorded archive with configurable
+    # latency, injected 5xx errors and a 429 rate limit, for offline scrape benchmarks
+
+    def __init__(self, archive_dir:str, latency_ms:int = 0, jitter_ms:int = 0, error_rate:float = 0.0,
+                 rate_limit:float = 0.0, retry_after:int = 1, seed:int = 0, port:int = 0):
+        self.logger = AppLogger.get_logger()
+        self.archive_dir = archive_dir
+        self.entries = ArchiveUtils.read_index(archive_dir)
+
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit  # requests per second, 0 = no limit
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.port = port
+
+        # token bucket for the rate limit; room for at least one request, or a limit under
+        # 1/s would never fill up to a whole token and every request would get a 429
+        self.capacity = max(1.0, rate_limit)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "served": 0, "missing": 0, "errors": 0, "rate_limited": 0}
+        self.server = None
+        self.thread = None
+
+    @staticmethod
+    def from_config(config, archive_dir:str):
+        return ReplayServer(
+            archive_dir,
+            latency_ms=int(config.get("replay.latency.ms") or 0),
+            jitter_ms=int(config.get("replay.jitter.ms") or 0),
+            error_rate=float(config.get("replay.error.rate") or 0),
+            rate_limit=float(config.get("replay.rate.limit") or 0),
+            seed=int(config.get("replay.seed") or 0)
+        )
+
+    def start(self) -> str:
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="replay-server", daemon=True)
+        self.thread.start()
+
+        base_url = "http://127.0.0.1:" + str(self.server.server_address[1])
+        self.logger.info("replay server on " + base_url + " serving " + str(len(self.entries)) + " recorded pages")
+        return base_url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            self.logger.info("replay server stats: " + str(self.stats))
+
+    def decide(self):
+        # what happens to the next request: None = serve it, otherwise an injected status
+        with self.lock:
+            self.stats["requests"] += 1
+
+            if self.rate_limit > 0:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate_limit)
+                self.last_refill = now
+                if self.tokens < 1:
+                    self.stats["rate_limited"] += 1
+                    return 429
+                self.tokens -= 1
+
+            if self.error_rate > 0 and self.random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return 503
+
+            delay = self.latency_ms + (self.random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        return None
+
+    def handler_class(self):
+        replay_server = self
+
+        class ReplayHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status = replay_server.decide()
+                if status == 429:
+                    self.send_response(429, "Too Many Requests")
+                    self.send_header("Retry-After", str(replay_server.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if status is not None:
+                    self.send_response(status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                url = parse_qs(urlparse(self.path).query).get("url", [""])[0]
+                entry = replay_server.entries.get(url)
+                if entry is None:
+                    with replay_server.lock:
+                        replay_server.stats["missing"] += 1
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                with open(os.path.join(replay_server.archive_dir, entry["body_file"]), "rb") as f:
+                    body = f.read()
+
+                with replay_server.lock:
+                    replay_server.stats["served"] += 1
+                self.send_response(entry["status"], entry.get("reason"))
+                self.send_header("Content-Type", entry.get("content_type") or "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # keep the per-request lines out of app.log
+                pass
+
+        return ReplayHandler
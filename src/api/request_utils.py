@@ -1,9 +1,17 @@
+import os
+import time
 import requests
 from bs4 import BeautifulSoup
 from src.api.api_utils import ApiUtils
+from src.api.transport import LiveTransport, RecordingTransport, ReplayTransport, ReplayServerTransport
+from src.api.replay_server import ReplayServer
 from src.logging.app_logger import AppLogger
 
 class RequestUtils(object):
+    transport = None
+    replay_server = None
+    retries = 3
+    stats = {"requests": 0, "retries": 0, "seconds": 0.0}
 
     def __init__(self, url, debug):
         self.url = url
@@ -20,10 +28,71 @@ class RequestUtils(object):
                 "Connection": "keep-alive"
                 }
 
+    @staticmethod
+    def set_up_transport(config):
+        # transport.mode: live (default), record, replay (in process) or server (local ReplayServer)
+        logger = AppLogger.get_logger()
+        mode = (config.get("transport.mode") or "live").strip().lower()
+        archive_dir = os.path.join(config.get("output.data.dir"), config.get("transport.archive.dir") or "archive")
 
-    def get_data(self):
+        RequestUtils.shut_down_transport()
+
+        if mode == "record":
+            RequestUtils.transport = RecordingTransport(archive_dir)
+        elif mode == "replay":
+            RequestUtils.transport = ReplayTransport(archive_dir)
+        elif mode == "server":
+            RequestUtils.replay_server = ReplayServer.from_config(config, archive_dir)
+            RequestUtils.transport = ReplayServerTransport(RequestUtils.replay_server.start())
+        else:
+            RequestUtils.transport = LiveTransport()
+
+        RequestUtils.retries = int(config.get("request.retries") or 3)
+        logger.info("transport: " + mode)
+        return RequestUtils.transport
+
+    @staticmethod
+    def shut_down_transport():
+        if RequestUtils.replay_server is not None:
+            RequestUtils.replay_server.stop()
+            RequestUtils.replay_server = None
+
+    @staticmethod
+    def get_transport():
+        if RequestUtils.transport is None:
+            RequestUtils.transport = LiveTransport()
+        return RequestUtils.transport
+
+    def fetch(self, stream=False):
+        # 429 and 5xx get retried with backoff, honouring Retry-After
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            RequestUtils.stats["requests"] += 1
+            response = RequestUtils.get_transport().get(self.url, self.headers, stream)
+            if response.status_code != 429 and response.status_code < 500 or attempt >= RequestUtils.retries:
+                break
+
+            attempt += 1
+            RequestUtils.stats["retries"] += 1
+            wait = self.retry_wait(response, attempt)
+            self.logger.info(str(response.status_code) + " from " + self.url + ", retry " + str(attempt) + " in " + str(wait) + "s", extra=AppLogger.SAMPLED)
+            # hand the connection back to the pool; a streamed response would keep it checked out
+            response.close()
+            time.sleep(wait)
+
+        RequestUtils.stats["seconds"] += time.perf_counter() - start
+        return response
+
+    def retry_wait(self, response, attempt):
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return int(retry_after)
+        return 2 ** (attempt - 1)
+
+    def get_page(self):
         #self.logger.info("Querying " + self.url)
-        response = requests.get(self.url, headers=self.headers)
+        response = self.fetch()
         ApiUtils.check_for_api_error(response)
 
         if self.debug is True:
@@ -33,16 +102,67 @@ class RequestUtils(object):
         #self.logger.info(str(info))
         #return info
 
-        html_str = response.text
+        return Page(response)
 
+    def get_data(self):
+        return self.get_page().soup
+
+    def download(self, file_path:str):
+        # raw bytes straight to the file, no parse and re-serialize
+        response = self.fetch(stream=True)
         try:
-            soup = BeautifulSoup(html_str, "html.parser")
-            #soup = BeautifulSoup(html_str, "html.parser").prettify().encode("utf-8", errors="replace").decode()
-            #self.logger.info(str(soup))
-        except UnicodeEncodeError as e:
-            self.logger.error("Unicode error: " + str(e))
-            
-        return soup
+            ApiUtils.check_for_api_error(response)
+        except Exception:
+            response.close()
+            raise
+
+        if self.debug is True:
+            ApiUtils.debug(response, streamed=True)
+
+        # into a temp file that replaces file_path only once the whole body is in: a dropped
+        # connection leaves no truncated page for the next run to take as already downloaded
+        temp_file_path = file_path + ".tmp"
+        try:
+            with open(temp_file_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+            os.replace(temp_file_path, file_path)
+        finally:
+            response.close()
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+
+
+class Page(object):
+    # a fetched page; the DOM is only built the first time someone asks for it
+
+    def __init__(self, response):
+        self.logger = AppLogger.get_logger()
+        self.response = response
+        self._soup = None
+
+    @property
+    def content(self) -> bytes:
+        return self.response.content
+
+    @property
+    def text(self) -> str:
+        return self.response.text
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            try:
+                self._soup = BeautifulSoup(self.response.text, "html.parser")
+                #soup = BeautifulSoup(html_str, "html.parser").prettify().encode("utf-8", errors="replace").decode()
+                #self.logger.info(str(soup))
+            except UnicodeEncodeError as e:
+                self.logger.error("Unicode error: " + str(e))
+        return self._soup
+
+    def save(self, file_path:str):
+        with open(file_path, "wb") as f:
+            f.write(self.response.content)
+
 
 
-  
\ No newline at end of file
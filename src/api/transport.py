@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import requests
+from urllib.parse import quote
+from src.logging.app_logger import AppLogger
+from src.service.file_service import FileService
+
+# a transport fetches one url and hands back a requests.Response,
+# so RequestUtils and ApiUtils work the same whichever one is plugged in
+
+class LiveTransport(object):
+    def __init__(self):
+        self.session = requests.Session()
+
+    def get(self, url, headers, stream=False):
+        return self.session.get(url, headers=headers, stream=stream)
+
+
+class RecordingTransport(object):
+    # fetches live and saves every response into the archive directory
+    def __init__(self, archive_dir:str, inner=None):
+        self.logger = AppLogger.get_logger()
+        self.archive_dir = archive_dir
+        self.index_file_path = os.path.join(archive_dir, "index.json")
+        self.inner = inner if inner is not None else LiveTransport()
+        os.makedirs(archive_dir, exist_ok=True)
+
+    def get(self, url, headers, stream=False):
+        # the body is read in full either way, it has to be archived
+        response = self.inner.get(url, headers)
+
+        body_file = ArchiveUtils.body_file_name(url)
+        with open(os.path.join(self.archive_dir, body_file), "wb") as f:
+            f.write(response.content)
+
+        FileService.append(self.index_file_path, {
+            "url": url,
+            "status": response.status_code,
+            "reason": response.reason,
+            "content_type": response.headers.get("Content-Type"),
+            "encoding": response.encoding,
+            "body_file": body_file
+        })
+        return response
+
+
+class ReplayTransport(object):
+    # serves archived responses without touching the network
+    def __init__(self, archive_dir:str):
+        self.logger = AppLogger.get_logger()
+        self.archive_dir = archive_dir
+        self.entries = ArchiveUtils.read_index(archive_dir)
+
+    def get(self, url, headers, stream=False):
+        entry = self.entries.get(url)
+        if entry is None:
+            self.logger.info("not in replay archive: " + url, extra=AppLogger.SAMPLED)
+            return ArchiveUtils.to_response(url, 404, "Not Found", b"", None, None)
+
+        with open(os.path.join(self.archive_dir, entry["body_file"]), "rb") as f:
+            body = f.read()
+        return ArchiveUtils.to_response(url, entry["status"], entry["reason"], body, entry.get("content_type"), entry.get("encoding"))
+
+
+class ReplayServerTransport(object):
+    # sends every request to a local ReplayServer, which looks the original url up in its archive
+    def __init__(self, base_url:str):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def get(self, url, headers, stream=False):
+        response = self.session.get(self.base_url + "/replay?url=" + quote(url, safe=""), headers=headers, stream=stream)
+        response.url = url
+        return response
+
+
+class ArchiveUtils(object):
+
+    @staticmethod
+    def body_file_name(url:str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest() + ".body"
+
+    @staticmethod
+    def read_index(archive_dir:str):
+        # later recordings of the same url win
+        index_file_path = os.path.join(archive_dir, "index.json")
+        if not FileService.file_exists(index_file_path):
+            return dict()
+        return {entry["url"]: entry for entry in FileService.read_file(index_file_path)}
+
+    @staticmethod
+    def to_response(url, status, reason, body:bytes, content_type, encoding):
+        response = requests.models.Response()
+        response.url = url
+        response.status_code = status
+        response.reason = reason
+        response._content = body
+        response._content_consumed = True  # iter_content serves the body from memory
+        response.encoding = encoding
+        if content_type:
+            response.headers["Content-Type"] = content_type
+        response.request = requests.Request("GET", url).prepare()
+        return response
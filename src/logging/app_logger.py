@@ -1,9 +1,21 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 import sys
+import threading
+import time
 
 class AppLogger(object):
+    # logger.info(..., extra=AppLogger.SAMPLED) on a call site inside a per-game / per-request
+    # loop; only those records are sampled, everything else (e.g. the configuration dump) passes
+    SAMPLED = {"sampled": True}
+
     logger = None
+    listener = None
+    truncating_filter = None
+    sampling_filter = None
 
     @staticmethod
     def set_up_logger(log_file_name:str):
@@ -13,25 +25,126 @@ class AppLogger(object):
         file_handler = logging.FileHandler(log_file_name)
         formatter = logging.Formatter("%(asctime)s %(levelname)s %(filename)s %(funcName)s %(lineno)s: %(message)s")
         file_handler.setFormatter(formatter)
-        
-        logger.addHandler(file_handler)
-        
+
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+
+        # callers only put records on a queue, a background thread does the file and console writes
+        AppLogger.shut_down()
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+
+        AppLogger.truncating_filter = TruncatingFilter()
+        AppLogger.sampling_filter = SamplingFilter()
+        queue_handler.addFilter(AppLogger.sampling_filter)
+        queue_handler.addFilter(AppLogger.truncating_filter)
+
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(queue_handler)
+
+        AppLogger.listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        AppLogger.listener.start()
+        atexit.register(AppLogger.shut_down)
 
         AppLogger.logger = logger
         return AppLogger.logger
-    
+
+    @staticmethod
+    def configure(config):
+        # log.max.message.length, log.sample.burst, log.sample.interval.seconds, log.sample.every
+        if AppLogger.truncating_filter is not None and config.get("log.max.message.length"):
+            AppLogger.truncating_filter.max_length = int(config.get("log.max.message.length"))
+
+        if AppLogger.sampling_filter is not None:
+            if config.get("log.sample.burst"):
+                AppLogger.sampling_filter.burst = int(config.get("log.sample.burst"))
+            if config.get("log.sample.interval.seconds"):
+                AppLogger.sampling_filter.interval = float(config.get("log.sample.interval.seconds"))
+            if config.get("log.sample.every"):
+                AppLogger.sampling_filter.every = int(config.get("log.sample.every"))
+
+    @staticmethod
+    def max_message_length() -> int:
+        if AppLogger.truncating_filter is None:
+            return TruncatingFilter.DEFAULT_MAX_LENGTH
+        return AppLogger.truncating_filter.max_length
+
+    @staticmethod
+    def shut_down():
+        # flushes whatever is still queued
+        if AppLogger.listener is not None:
+            AppLogger.listener.stop()
+            AppLogger.listener = None
+
     # @staticmethod
     # def get_logger():
     #     if AppLogger.logger is None:
     #         AppLogger.logger = AppLogger.set_up_logger()
-            
+
     #     return AppLogger.logger
 
     @staticmethod
     def get_logger():
         return AppLogger.logger
-    
-#AppLogger.get_logger().info("hello")
\ No newline at end of file
+
+
+class TruncatingFilter(logging.Filter):
+    # response bodies and whole DOMs get cut down before they are queued
+    DEFAULT_MAX_LENGTH = 2000
+
+    def __init__(self, max_length:int = DEFAULT_MAX_LENGTH):
+        super().__init__()
+        self.max_length = max_length
+
+    def filter(self, record):
+        if self.max_length <= 0:
+            return True
+
+        message = record.getMessage()
+        if len(message) > self.max_length:
+            record.msg = message[:self.max_length] + " ... [truncated " + str(len(message) - self.max_length) + " chars]"
+            record.args = None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    # per message type (the logging call site): the first `burst` INFO/DEBUG records in each
+    # `interval` pass, after that only one in `every`; warnings, errors and records not logged
+    # with extra=AppLogger.SAMPLED always pass
+
+    def __init__(self, burst:int = 50, interval:float = 10.0, every:int = 100):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.every = every
+        self.windows = dict()
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.burst <= 0 or not getattr(record, "sampled", False):
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                window = [now, 0, 0]
+                self.windows[key] = window
+                if suppressed:
+                    record.msg = str(record.msg) + " [" + str(suppressed) + " similar messages suppressed]"
+
+            window[1] += 1
+            if window[1] <= self.burst:
+                return True
+
+            if self.every > 0 and (window[1] - self.burst) % self.every == 0:
+                record.msg = str(record.msg) + " [sampled 1/" + str(self.every) + "]"
+                return True
+
+            window[2] += 1
+            return False
+
+#AppLogger.get_logger().info("hello")
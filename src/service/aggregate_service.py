@@ -0,0 +1,200 @@
+import itertools
+import json
+import os
+from src.logging.app_logger import AppLogger
+from src.service.file_service import FileService
+
+class AggregateService(object):
+    # season/team rollups kept up to date as games are appended, so reports read
+    # precomputed numbers instead of re-aggregating every season file
+    #
+    # rollups are keyed "season|teamId"; "season|all" is the whole season and "all|teamId" a team over every season.
+    # counts are per team-game, so a season rollup sees every game once from each side
+    #
+    # the aggregates file only holds the counters. the team-games already counted go in a separate
+    # append-only file, one [section, "gameId:teamId"] line each, so saving after one more game
+    # rewrites the counters and appends two lines instead of rewriting every game id. the counters
+    # file records how many of those lines it includes: lines past that (appended, then a crash
+    # before the counters were saved) are dropped on load
+
+    CLOSE_GAME_POINTS = 5
+    COUNTS = ("PTS", "FG", "FGA", "FG3", "FG3A", "FT", "FTA", "REB", "AST", "TO")
+    MARGIN_BUCKETS = ((-999, -10, "<=-10"), (-9, -5, "-9..-5"), (-4, -1, "-4..-1"), (0, 0, "0"), (1, 4, "1..4"), (5, 9, "5..9"), (10, 999, ">=10"))
+    SECTIONS = ("boxscore", "playbyplay")
+
+    def __init__(self, config):
+        self.logger = AppLogger.get_logger()
+        self.config = config
+
+        self.output_dir = config.get("output.data.dir")
+        self.aggregates_data_path = os.path.join(self.output_dir, "aggregates")
+        os.makedirs(self.aggregates_data_path, exist_ok=True)
+        self.aggregates_file_path = os.path.join(self.aggregates_data_path, config.get("aggregates.data.file") or "aggregates.json")
+
+        self.views = None
+        # section -> set of "gameId:teamId" already counted, and the ones not saved yet
+        self.applied = None
+        self.unsaved = list()
+        # the applied-ids file: a new generation is written whole after a reset, otherwise appended to
+        self.generation = 0
+        self.applied_lines = 0
+        self.rewrite = False
+
+    def applied_file_path(self, generation:int):
+        return os.path.splitext(self.aggregates_file_path)[0] + "_applied_" + str(generation) + ".json"
+
+    def load(self):
+        if self.views is None:
+            self.views = {section: dict() for section in AggregateService.SECTIONS}
+            self.applied = {section: set() for section in AggregateService.SECTIONS}
+            if FileService.file_exists(self.aggregates_file_path):
+                with open(self.aggregates_file_path, "r") as f:
+                    on_disk = json.load(f)
+                applied = on_disk.pop("applied", {"generation": 0, "lines": 0})
+                self.views.update(on_disk)
+                self.generation, self.applied_lines = applied["generation"], applied["lines"]
+
+                applied_file_path = self.applied_file_path(self.generation)
+                if FileService.file_exists(applied_file_path):
+                    lines = FileService.iter_file(applied_file_path)
+                    for section, team_game in itertools.islice(lines, self.applied_lines):
+                        self.applied[section].add(team_game)
+                    # anything past the saved count never made it into the counters
+                    self.rewrite = next(lines, None) is not None
+                    lines.close()
+
+                # files from before the ids moved out kept a list of them in every rollup
+                for section, rollups in self.views.items():
+                    for rollup in rollups.values():
+                        if isinstance(rollup["games"], list):
+                            self.applied[section].update(rollup["games"])
+                            rollup["games"] = len(rollup["games"])
+                            self.rewrite = True
+        return self.views
+
+    def save(self):
+        # ids first, then the counters (write then rename, so a reader never sees half a file)
+        views = self.load()
+        previous_file_path = self.applied_file_path(self.generation)
+        if self.rewrite:
+            self.generation += 1
+            lines = [[section, team_game] for section in AggregateService.SECTIONS for team_game in sorted(self.applied[section])]
+            FileService.delete_file(self.applied_file_path(self.generation))
+            FileService.append_all(self.applied_file_path(self.generation), lines)
+            self.applied_lines = len(lines)
+        else:
+            FileService.append_all(self.applied_file_path(self.generation), self.unsaved)
+            self.applied_lines += len(self.unsaved)
+
+        temp_file_path = self.aggregates_file_path + ".tmp"
+        with open(temp_file_path, "w") as f:
+            json.dump(dict(views, applied={"generation": self.generation, "lines": self.applied_lines}), f)
+        os.replace(temp_file_path, self.aggregates_file_path)
+
+        if self.rewrite:
+            FileService.delete_file(previous_file_path)
+        self.unsaved = list()
+        self.rewrite = False
+
+    def reset(self, section:str):
+        # a full re-generation of boxscore or playbyplay files starts that section over
+        self.load()[section] = dict()
+        self.applied[section] = set()
+        self.unsaved = [line for line in self.unsaved if line[0] != section]
+        self.rewrite = True
+
+    def mark_applied(self, section:str, team_game:str):
+        # False if this team-game is already in the section's rollups
+        self.load()
+        if team_game in self.applied[section]:
+            return False
+        self.applied[section].add(team_game)
+        self.unsaved.append([section, team_game])
+        return True
+
+    def rollup_keys(self, season, team_id):
+        return [str(season) + "|" + str(team_id), str(season) + "|all", "all|" + str(team_id)]
+
+    def rollup(self, section:str, key:str):
+        rollups = self.load()[section]
+        if key not in rollups:
+            rollups[key] = {"games": 0}
+        return rollups[key]
+
+    def apply_boxscore(self, game):
+        # idempotent: a team-game already counted is skipped
+        home, away = game["homeTeam"], game["awayTeam"]
+        sides = ((game["homeTeamId"], home, away), (game["awayTeamId"], away, home))
+
+        for team_id, team, opponent in sides:
+            if not self.mark_applied("boxscore", str(game["gameId"]) + ":" + str(team_id)):
+                continue
+            margin = team["PTS"] - opponent["PTS"]
+            for key in self.rollup_keys(game["season"], team_id):
+                rollup = self.rollup("boxscore", key)
+                rollup["games"] += 1
+
+                for stat in AggregateService.COUNTS:
+                    rollup[stat] = rollup.get(stat, 0) + team[stat]
+                    rollup["opp_" + stat] = rollup.get("opp_" + stat, 0) + opponent[stat]
+
+                result = "wins" if margin > 0 else "losses"
+                rollup[result] = rollup.get(result, 0) + 1
+                if abs(margin) <= AggregateService.CLOSE_GAME_POINTS:
+                    rollup["close_" + result] = rollup.get("close_" + result, 0) + 1
+
+    def apply_playbyplay(self, game):
+        if game["available"] != "Y":
+            return
+
+        scores = game["end_quarter_scores"]
+        for team_id, sign in ((game["homeTeamId"], 1), (game["awayTeamId"], -1)):
+            if not self.mark_applied("playbyplay", str(game["gameId"]) + ":" + str(team_id)):
+                continue
+            for key in self.rollup_keys(game["season"], team_id):
+                rollup = self.rollup("playbyplay", key)
+                rollup["games"] += 1
+
+                # distribution of the margin (from this team's side) at the end of each quarter
+                for q, quarter in scores.items():
+                    margin = sign * (quarter[q + "_home_team_score"] - quarter[q + "_away_team_score"])
+                    histogram = rollup.setdefault(q + "_margins", dict())
+                    bucket = AggregateService.margin_bucket(margin)
+                    histogram[bucket] = histogram.get(bucket, 0) + 1
+
+    @staticmethod
+    def margin_bucket(margin:int) -> str:
+        for low, high, name in AggregateService.MARGIN_BUCKETS:
+            if low <= margin <= high:
+                return name
+        return AggregateService.MARGIN_BUCKETS[-1][2] if margin > 0 else AggregateService.MARGIN_BUCKETS[0][2]
+
+    def rebuild(self, boxscore_data_path:str, playbyplay_data_path:str):
+        self.reset("boxscore")
+        for game in FileService.iter_all_files_in_directory(boxscore_data_path):
+            self.apply_boxscore(game)
+        self.reset("playbyplay")
+        for game in FileService.iter_all_files_in_directory(playbyplay_data_path):
+            self.apply_playbyplay(game)
+        self.save()
+
+    def get(self, season, team_id="all"):
+        # one dict lookup per section, plus the derived percentages
+        views = self.load()
+        key = str(season) + "|" + str(team_id)
+        boxscore = views["boxscore"].get(key)
+        playbyplay = views["playbyplay"].get(key)
+        if boxscore is None and playbyplay is None:
+            return None
+
+        result = {"season": str(season), "teamId": str(team_id)}
+        if boxscore is not None:
+            result.update({k: v for k, v in boxscore.items() if k != "games"})
+            result["games"] = boxscore["games"]
+            for made, attempts in (("FG", "FGA"), ("FG3", "FG3A"), ("FT", "FTA"), ("opp_FG", "opp_FGA"), ("opp_FG3", "opp_FG3A"), ("opp_FT", "opp_FTA")):
+                result[made + "_pct"] = round(boxscore[made] / boxscore[attempts], 3) if boxscore.get(attempts) else None
+        if playbyplay is not None:
+            result.update({k: v for k, v in playbyplay.items() if k != "games"})
+            result["playbyplay_games"] = playbyplay["games"]
+
+        return result
@@ -1,8 +1,12 @@
 import os
+import re
 import sys
 from bs4 import BeautifulSoup
 from src.logging.app_logger import AppLogger
 from src.service.file_service import FileService
+from src.service.player_table import PlayerTable
+from src.service.sqlite_service import SqliteService
+from src.service.aggregate_service import AggregateService
 
 class BoxscoreService(object):
     def __init__(self, config):
@@ -18,6 +22,10 @@ class BoxscoreService(object):
         self.boxscore_data_path = os.path.join(self.output_dir, "boxscore")
         os.makedirs(self.boxscore_data_path, exist_ok=True)
 
+        self.players_data_file = config.get("players.data.file")
+        self.players_data_path = os.path.join(self.output_dir, "players")
+        os.makedirs(self.players_data_path, exist_ok=True)
+
     def collect_boxscore_data(self):
         do_boxscore = self.config.get("do.boxscore")
         if not do_boxscore or do_boxscore.strip().lower() != "y":
@@ -25,41 +33,92 @@ class BoxscoreService(object):
             return
         
         FileService.delete_all_files_in_directory(self.boxscore_data_path)
+        FileService.delete_all_files_in_directory(self.players_data_path)
         
+        aggregates = AggregateService(self.config)
+        aggregates.reset("boxscore")
+
+        player_tables = dict()
+        sqlite_games = list()
         games_list = FileService.read_file(self.metadata_file_path)
         for game in games_list:
-            del game["playbyplay_url"] # don't want in boxscore file
-            del game["playbyplay_file"] # don't want in boxscore file
-            
-            boxscore_file = game["boxscore_file"]
-           
-            teams_dict, team_totals = self.process_boxscore_file(boxscore_file)
-            if team_totals is None or teams_dict is None:
+            game = self.build_boxscore_record(game, player_tables)
+            if game is None:
                 self.logger.error("no team totals, returning")
                 break
 
-            #self.logger.info(str(teams_dict))
-            #self.logger.info(str(team_totals))
-            homeTeam = teams_dict["homeTeam"].strip()
-            awayTeam = teams_dict["awayTeam"].strip()
-            homeTeamId = teams_dict["homeTeamId"].strip()
-            awayTeamId = teams_dict["awayTeamId"].strip()
-
-            game["homeTeamId"] = homeTeamId
-            game["awayTeamId"] = awayTeamId
-
-            for t in team_totals:
-                if t["team"] == homeTeam:
-                    game["homeTeam"] = t
-                elif t["team"] == awayTeam:
-                    game["awayTeam"] = t
-
             #for k,v in game.items():
             #    self.logger.info(k + " -> " + str(v))
 
             season = game["season"]
             boxscore_data_file_path = os.path.join(self.boxscore_data_path, self.boxscore_data_file.replace("YYYY", str(season)))
             FileService.append(boxscore_data_file_path, game)
+            sqlite_games.append(game)
+            aggregates.apply_boxscore(game)
+
+        self.write_players(player_tables)
+        aggregates.save()
+
+        sqlite_service = SqliteService(self.config)
+        sqlite_service.write_boxscores(sqlite_games)
+        sqlite_service.prune([game["gameId"] for game in sqlite_games])
+        sqlite_service.close()
+
+    def write_game(self, record, player_tables, aggregates):
+        # one newly completed game, as built by build_boxscore_record, onto the existing season files;
+        # the caller saves aggregates once for however many games it writes
+        boxscore_data_file_path = os.path.join(self.boxscore_data_path, self.boxscore_data_file.replace("YYYY", str(record["season"])))
+        FileService.append(boxscore_data_file_path, record)
+        self.write_players(player_tables)
+
+        aggregates.apply_boxscore(record)
+
+        sqlite_service = SqliteService(self.config)
+        sqlite_service.write_boxscores([record])
+        sqlite_service.close()
+
+    def build_boxscore_record(self, game, player_tables):
+        del game["playbyplay_url"] # don't want in boxscore file
+        del game["playbyplay_file"] # don't want in boxscore file
+        
+        boxscore_file = game["boxscore_file"]
+       
+        teams_dict, team_totals, players = self.process_boxscore_file(boxscore_file)
+        if team_totals is None or teams_dict is None:
+            return None
+
+        #self.logger.info(str(teams_dict))
+        #self.logger.info(str(team_totals))
+        homeTeam = teams_dict["homeTeam"].strip()
+        awayTeam = teams_dict["awayTeam"].strip()
+        homeTeamId = teams_dict["homeTeamId"].strip()
+        awayTeamId = teams_dict["awayTeamId"].strip()
+
+        game["homeTeamId"] = homeTeamId
+        game["awayTeamId"] = awayTeamId
+
+        for t in team_totals:
+            if t["team"] == homeTeam:
+                game["homeTeam"] = t
+            elif t["team"] == awayTeam:
+                game["awayTeam"] = t
+
+        # player lines came out of the same tables as the team totals
+        season = game["season"]
+        player_table = player_tables.setdefault(season, PlayerTable())
+        team_ids = {homeTeam: homeTeamId, awayTeam: awayTeamId}
+        for p in players:
+            team_id = team_ids.get(p["team"])
+            if team_id is None:
+                continue
+            player_table.add(season, game["gameId"], team_id, p["playerId"], p["player"], p["starter"], p)
+
+        return game
+
+    def write_players(self, player_tables):
+        for season, player_table in player_tables.items():
+            players_data_file_path = os.path.join(self.players_data_path, self.players_data_file.replace("YYYY", str(season)))
+            player_table.write(players_data_file_path)
 
     def process_boxscore_file(self, boxscore_file:str):
         with open(boxscore_file, "r", encoding="utf8") as file:
@@ -69,22 +128,23 @@ class BoxscoreService(object):
             teams_dict = self.extract_home_away(soup)
             if teams_dict is None:
                 self.logger.error("No teams_dict")
-                return None, None
+                return None, None, None
 
             # extract team stats
             teams = soup.select("div.Boxscore.flex.flex-column:has(.Boxscore__Title)")
 
             results = []
+            players = []
             for team in teams:
-                team_totals = self.extract_team_totals(team)
+                team_totals = self.extract_team_totals(team, players)
                 #self.logger.info(str(team_totals))
                 if team_totals is None:
-                    self.logger.info(team + ": no totals")
-                    return None, None
+                    self.logger.info(str(team) + ": no totals", extra=AppLogger.SAMPLED)
+                    return None, None, None
                 else:
                     results.append(team_totals)
 
-            return teams_dict, results
+            return teams_dict, results, players
         
         
     def extract_home_away(self, soup):
@@ -141,18 +201,18 @@ class BoxscoreService(object):
 
 
 
-    def extract_team_totals(self, team_block):
+    def extract_team_totals(self, team_block, players=None):
         team_name = team_block.select_one(".BoxscoreItem__TeamName").get_text(strip=True)
         #self.logger.info(team_name)
         
         scroller = team_block.select_one("div.Table__Scroller table")
         if not scroller:
-            self.logger.info("no scroller")
+            self.logger.info("no scroller", extra=AppLogger.SAMPLED)
             return None
         
         all_rows = scroller.select("tbody tr")
         if len(all_rows) < 10:  # Basic sanity check
-            self.logger.info("not at least 10 rows")
+            self.logger.info("not at least 10 rows", extra=AppLogger.SAMPLED)
             return None
         
         # Team totals are 2nd-to-last row (index -2)
@@ -199,13 +259,72 @@ class BoxscoreService(object):
 
             #self.logger.info(str(return_stats))
 
+            if players is not None:
+                players.extend(self.extract_player_rows(team_block, team_name, all_rows[:-2]))
+
             return return_stats
         else:
-            self.logger.info("no data")
+            self.logger.info("no data", extra=AppLogger.SAMPLED)
         
         return None
 
+    def extract_player_rows(self, team_block, team_name:str, stat_rows):
+        # names live in the fixed left table, stats in the scroller table, row for row
+        name_rows = team_block.select("table.Table--fixed-left tbody tr")
+        if len(name_rows) < len(stat_rows):
+            self.logger.info(team_name + ": player names do not line up with stats", extra=AppLogger.SAMPLED)
+            return []
 
+        players = []
+        header_count = 0
+        for name_row, stat_row in zip(name_rows, stat_rows):
+            cells = [td.get_text(strip=True) for td in stat_row.select("td")]
 
-        
-  
\ No newline at end of file
+            # "MIN PTS FG ..." header rows start the starters and the bench
+            if cells and cells[0] == "MIN":
+                header_count += 1
+                continue
+
+            # DNP rows have a single text cell
+            if len(cells) < 13 or not cells[0].isdigit():
+                continue
+
+            link = name_row.select_one("a[href]")
+            if link is None:
+                continue
+            match = re.search(r"/id/(\d+)", link["href"])
+            if not match:
+                continue
+
+            name = name_row.select_one(".Boxscore__AthleteName--long") or link
+            try:
+                fgm, fga = cells[2].split("-")
+                fg3m, fg3a = cells[3].split("-")
+                ftm, fta = cells[4].split("-")
+
+                players.append({
+                    "team": team_name,
+                    "playerId": match.group(1),
+                    "player": name.get_text(strip=True),
+                    "starter": header_count <= 1,
+                    "MIN": int(cells[0]),
+                    "PTS": int(cells[1]),
+                    "FG": int(fgm),
+                    "FGA": int(fga),
+                    "FG3": int(fg3m),
+                    "FG3A": int(fg3a),
+                    "FT": int(ftm),
+                    "FTA": int(fta),
+                    "REB": int(cells[5]),
+                    "AST": int(cells[6]),
+                    "TO": int(cells[7]),
+                    "STL": int(cells[8]),
+                    "BLK": int(cells[9]),
+                    "OREB": int(cells[10]),
+                    "DREB": int(cells[11]),
+                    "PF": int(cells[12])
+                })
+            except ValueError as e:
+                self.logger.info(team_name + ": bad player row " + str(cells) + " " + str(e), extra=AppLogger.SAMPLED)
+
+        return players
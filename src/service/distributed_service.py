@@ -0,0 +1,207 @@
+import os
+import re
+import socket
+import threading
+import time
+from src.logging.app_logger import AppLogger
+from src.service.file_service import FileService
+from src.service.work_queue import WorkQueue
+from src.service.scraper import Scraper
+from src.service.boxscore_service import BoxscoreService
+from src.service.playbyplay_service import PlaybyplayService
+from src.service.player_table import PlayerTable
+from src.service.sqlite_service import SqliteService
+from src.service.aggregate_service import AggregateService
+
+class DistributedService(object):
+    # scrape + parse split into queue units: a schedule unit (team, season) adds one game unit
+    # per completed game, a game unit downloads its pages and adds a parse unit, a parse unit
+    # builds the boxscore / playbyplay / player records. results land in the queue's results
+    # table; publish() writes the usual data files from them once the queue is drained.
+    #
+    # distributed.mode: local        - coordinator plus distributed.workers threads in this process
+    #                   coordinator  - enqueue, wait for the queue to drain, publish
+    #                   worker       - lease and run units until the queue is drained
+    SCHEDULE, GAME, PARSE = "schedule", "game", "parse"
+
+    def __init__(self, config):
+        self.logger = AppLogger.get_logger()
+        self.config = config
+
+        self.mode = (config.get("distributed.mode") or "off").strip().lower()
+        self.workers = int(config.get("distributed.workers") or 4)
+        self.poll_seconds = float(config.get("distributed.poll.seconds") or 5)
+        # a worker that has never seen a unit waits this long for the coordinator before giving up
+        self.idle_seconds = float(config.get("distributed.worker.idle.seconds") or 60)
+
+        team_ids = config.get("distributed.team.ids") or config.get("team.id")
+        self.team_ids = [t.strip() for t in team_ids.split(",") if t.strip()]
+        Scraper.check_file_names(config, self.team_ids)
+        self.seasons = [season.strip() for season in config.get("seasons").split(",")]
+
+        self.output_dir = config.get("output.data.dir")
+        self.metadata_file_path = os.path.join(self.output_dir, config.get("metadata.file"))
+
+    def run(self):
+        if self.mode == "local":
+            self.seed()
+            threads = [threading.Thread(target=self.work, args=(self.worker_name(i), False)) for i in range(self.workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.publish()
+        elif self.mode == "coordinator":
+            self.seed()
+            self.wait()
+            self.publish()
+        elif self.mode == "worker":
+            self.work(self.worker_name())
+        else:
+            self.logger.info("not running distributed scrape")
+
+    def worker_name(self, index=None):
+        name = socket.gethostname() + ":" + str(os.getpid())
+        return name if index is None else name + ":" + str(index)
+
+    def team_config(self, team_id):
+        config = dict(self.config)
+        config["team.id"] = team_id
+        return config
+
+    def seed(self):
+        queue = WorkQueue(self.config)
+        units = [("schedule:" + team_id + ":" + season, DistributedService.SCHEDULE, {"team_id": team_id, "season": season})
+                 for team_id in self.team_ids for season in self.seasons]
+        added = queue.enqueue(units)
+        # a schedule keeps changing over a season, so a finished one is fetched again on every run;
+        # game and parse ids stay deterministic, so games from earlier runs are not queued twice
+        reset = queue.reset([unit_id for unit_id, kind, payload in units])
+        queue.close()
+        self.logger.info("queued " + str(added) + " new and " + str(reset) + " finished schedule units (" + str(len(units) - added - reset) + " still open)")
+
+    def wait(self):
+        queue = WorkQueue(self.config)
+        while queue.open_units() > 0:
+            self.logger.info("queue: " + str(queue.counts()))
+            time.sleep(self.poll_seconds)
+        queue.close()
+
+    def work(self, worker:str, wait_for_work:bool = True):
+        # wait_for_work: a separate worker may start before the coordinator has queued anything
+        queue = WorkQueue(self.config)
+        started = time.time()
+        done = 0
+
+        while True:
+            unit = queue.lease(worker)
+            if unit is None:
+                # finished once nothing is pending or leased: children are queued in the same
+                # transaction as their parent's result, so there is no gap where work is missing
+                if queue.open_units() == 0 and (not wait_for_work or done > 0 or time.time() - started > self.idle_seconds):
+                    break
+                time.sleep(self.poll_seconds)
+                continue
+
+            try:
+                result, children = self.handle(unit)
+            except Exception as e:
+                self.logger.error(worker + ": " + unit["unit_id"] + " failed: " + str(e))
+                queue.fail(unit, str(e))
+                continue
+
+            if not queue.complete(unit, worker, result, children):
+                self.logger.info(worker + ": " + unit["unit_id"] + " already had a result")
+            done += 1
+
+        queue.close()
+        self.logger.info(worker + ": " + str(done) + " units")
+
+    def handle(self, unit):
+        # returns (result, follow-on units)
+        payload = unit["payload"]
+        if unit["kind"] == DistributedService.SCHEDULE:
+            return self.handle_schedule(payload)
+        if unit["kind"] == DistributedService.GAME:
+            return self.handle_game(payload)
+        if unit["kind"] == DistributedService.PARSE:
+            return self.handle_parse(payload)
+        raise ValueError("unknown unit kind " + str(unit["kind"]))
+
+    def handle_schedule(self, payload):
+        scraper = Scraper(self.team_config(payload["team_id"]))
+        schedule_soup = scraper.scrape_schedule(payload["season"])
+
+        children = list()
+        for url in scraper.game_urls(schedule_soup):
+            match = re.search(r'gameId/(\d+)', url)
+            if match:
+                children.append(("game:" + match.group(1), DistributedService.GAME, {"team_id": payload["team_id"], "season": payload["season"], "url": url}))
+        return {"team_id": payload["team_id"], "season": payload["season"], "games": len(children)}, children
+
+    def handle_game(self, payload):
+        game = Scraper(self.team_config(payload["team_id"])).fetch_game(payload["season"], payload["url"])
+        return game, [("parse:" + str(game["gameId"]), DistributedService.PARSE, game)]
+
+    def handle_parse(self, game):
+        player_tables = dict()
+        boxscore = BoxscoreService(self.config).build_boxscore_record(dict(game), player_tables)
+        if boxscore is None:
+            raise ValueError("no team totals for " + str(game["gameId"]))
+        playbyplay = PlaybyplayService(self.config).build_playbyplay_record(dict(game), boxscore)
+
+        players = [table.row(i) for table in player_tables.values() for i in range(len(table))]
+        return {"boxscore": boxscore, "playbyplay": playbyplay, "players": players}, []
+
+    def publish(self):
+        # the data files, rebuilt from the committed results: running it twice gives the same files
+        queue = WorkQueue(self.config)
+        failures = queue.failures()
+        if failures:
+            self.logger.error(str(len(failures)) + " units failed: " + str(failures[:10]))
+
+        FileService.delete_file(self.metadata_file_path)
+        FileService.append_all(self.metadata_file_path, queue.results(DistributedService.GAME))
+
+        boxscore_service = BoxscoreService(self.config)
+        playbyplay_service = PlaybyplayService(self.config)
+        FileService.delete_all_files_in_directory(boxscore_service.boxscore_data_path)
+        FileService.delete_all_files_in_directory(boxscore_service.players_data_path)
+        FileService.delete_all_files_in_directory(playbyplay_service.playbyplay_data_path)
+
+        sqlite_service = SqliteService(self.config)
+        batch_size = int(self.config.get("join.chunk.size") or 5000)
+        player_tables = dict()
+        boxscores, playbyplays = list(), list()
+        game_ids = list()
+        published = 0
+        for result in queue.results(DistributedService.PARSE):
+            if len(boxscores) >= batch_size:
+                sqlite_service.write_boxscores(boxscores)
+                sqlite_service.write_playbyplay(playbyplays)
+                boxscores, playbyplays = list(), list()
+
+            boxscore, playbyplay = result["boxscore"], result["playbyplay"]
+            season = str(boxscore["season"])
+            FileService.append(os.path.join(boxscore_service.boxscore_data_path, boxscore_service.boxscore_data_file.replace("YYYY", season)), boxscore)
+            FileService.append(os.path.join(playbyplay_service.playbyplay_data_path, playbyplay_service.playbyplay_data_file.replace("YYYY", season)), playbyplay)
+
+            player_table = player_tables.setdefault(season, PlayerTable())
+            for row in result["players"]:
+                player_table.add_row(row)
+
+            boxscores.append(boxscore)
+            playbyplays.append(playbyplay)
+            game_ids.append(boxscore["gameId"])
+            published += 1
+        queue.close()
+
+        boxscore_service.write_players(player_tables)
+
+        sqlite_service.write_boxscores(boxscores)
+        sqlite_service.write_playbyplay(playbyplays)
+        sqlite_service.prune(game_ids)
+        sqlite_service.close()
+
+        AggregateService(self.config).rebuild(boxscore_service.boxscore_data_path, playbyplay_service.playbyplay_data_path)
+        self.logger.info("published " + str(published) + " games")
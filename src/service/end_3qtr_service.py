@@ -1,30 +1,82 @@
 import re
 import os
+from functools import partial
 from datetime import datetime
 from src.logging.app_logger import AppLogger
 from src.api.request_utils import RequestUtils
 from src.service.file_service import FileService
+from src.service.map_reduce_runner import MapReduceRunner
+from src.service.sqlite_service import SqliteService
+from src.service.aggregate_service import AggregateService
+from src.service.records import GameRecord
 
 class End3QtrService(object):
     def __init__(self, config):
         self.logger = AppLogger.get_logger()
         self.config = config
 
-        self.team_id = config.get("team.id")
+        self.team_id = int(config.get("team.id"))
+        self.seasons = [season.strip() for season in config.get("seasons").split(",")]
 
         self.output_dir = config.get("output.data.dir")
         self.playbyplay_data_file = config.get("playbyplay.data.file")
         self.playbyplay_data_path = os.path.join(self.output_dir, "playbyplay")
 
-    def analyze_after_3_quarters(self, win_or_loss):
-        # collect the playbyplay data
-        playbyplay_list = FileService.read_all_files_in_directory(self.playbyplay_data_path)
+    def quarter_margin_report(self, quarter="q3"):
+        # straight from the season rollups, nothing re-aggregated
+        aggregates = AggregateService(self.config)
+        for season in self.seasons:
+            rollup = aggregates.get(season, self.team_id)
+            if rollup is None or quarter + "_margins" not in rollup:
+                continue
+            margins = rollup[quarter + "_margins"]
+            print(season + " end of " + quarter + " margins: " + ", ".join(b[2] + ": " + str(margins.get(b[2], 0)) for b in AggregateService.MARGIN_BUCKETS))
 
-        filtered_playbyplay_list = self.filter_by_losses_or_wins(win_or_loss, 5, playbyplay_list)
+    def analyze_after_3_quarters(self, win_or_loss):
+        sqlite_service = SqliteService(self.config)
+        if sqlite_service.enabled:
+            # indexed lookup instead of scanning the season files
+            filtered_playbyplay_list = GameRecord.decode_all(sqlite_service.close_playbyplay_games(self.team_id, 5, win_or_loss))
+            sqlite_service.close()
+            self.analysis_3q(filtered_playbyplay_list)
+            self.analysis_3q_totals(self.aggregate_3q(filtered_playbyplay_list), win_or_loss)
+            return
+
+        # filter + aggregate each season's playbyplay file in its own process
+        partitions = MapReduceRunner.file_partitions(self.playbyplay_data_path)
+        filtered_playbyplay_list, counts = MapReduceRunner(self.config).run(
+            partitions, partial(self.map_close_games, win_or_loss), self.reduce_close_games)
         #for bs in filtered_boxscore_list:
         #    self.logger.info(str(bs))
 
         self.analysis_3q(filtered_playbyplay_list)
+        self.analysis_3q_totals(counts, win_or_loss)
+
+    def map_close_games(self, win_or_loss, playbyplay_file):
+        playbyplay_list = GameRecord.decode_all(FileService.read_file(playbyplay_file))
+        filtered = self.filter_by_losses_or_wins(win_or_loss, 5, playbyplay_list)
+        return filtered, self.aggregate_3q(filtered)
+
+    def reduce_close_games(self, partials):
+        games = MapReduceRunner.merge_sorted([p[0] for p in partials], key=lambda pbp: (str(pbp.season), pbp.game_date))
+        counts = MapReduceRunner.sum_counts([p[1] for p in partials])
+        return games, counts
+
+    def aggregate_3q(self, pbp_list):
+        # where our team stood after 3 quarters
+        counts = {"games": 0, "led": 0, "tied": 0, "trailed": 0}
+        for pbp in pbp_list:
+            margin = pbp.side(self.team_id) * pbp.end_quarter_scores.margin(3)
+
+            counts["games"] += 1
+            if margin > 0:
+                counts["led"] += 1
+            elif margin < 0:
+                counts["trailed"] += 1
+            else:
+                counts["tied"] += 1
+
+        return counts
 
 
     def filter_by_losses_or_wins(self, win_or_loss, point_diff, playbyplay_list):
@@ -33,12 +85,12 @@ class End3QtrService(object):
         for pbp in playbyplay_list:
             # for k,v in pbp.items():
             #     self.logger.info(k + " -> " + str(v))
-            homeTeamId = pbp["homeTeamId"]
-            awayTeamId = pbp["awayTeamId"]
-            homeTeamScore = pbp["homeTeamPoints"]
-            awayTeamScore = pbp["awayTeamPoints"]
+            homeTeamId = pbp.homeTeamId
+            awayTeamId = pbp.awayTeamId
+            homeTeamScore = pbp.homeTeamPoints
+            awayTeamScore = pbp.awayTeamPoints
 
-            if pbp["available"] == "N":
+            if pbp.available == "N":
                 continue
 
             if abs(homeTeamScore - awayTeamScore) > point_diff:
@@ -61,18 +113,23 @@ class End3QtrService(object):
         for pbp in pbp_list:
             #self.logger.info(str(pbp))
 
-            game_date = pbp["game_date"]
-            away_team = pbp["awayTeam"]
-            home_team = pbp["homeTeam"]
-            away_team_pts = pbp["awayTeamPoints"]
-            home_team_pts = pbp["homeTeamPoints"]
+            game_date = pbp.game_date
+            away_team = pbp.awayTeam
+            home_team = pbp.homeTeam
+            away_team_pts = pbp.awayTeamPoints
+            home_team_pts = pbp.homeTeamPoints
             
-            home_team_3qtr_score = pbp["end_quarter_scores"]["q3"]["q3_home_team_score"]
-            away_team_3qtr_score = pbp["end_quarter_scores"]["q3"]["q3_away_team_score"]
+            home_team_3qtr_score = pbp.end_quarter_scores.home[2]
+            away_team_3qtr_score = pbp.end_quarter_scores.away[2]
 
             #print("")
 
             #print(game_date + " "  + away_team + " at "  + home_team + ": Final Score: " + " " + home_team + " " + str(home_team_pts) + " " + away_team + " " + str(away_team_pts))
             print(game_date + " 3Q End: " + home_team + " " + str(home_team_3qtr_score) + " " + away_team + " " + str(away_team_3qtr_score))
 
+    def analysis_3q_totals(self, counts, win_or_loss):
+        if not counts or counts["games"] == 0:
+            return
 
+        print("")
+        print(win_or_loss + " (" + str(counts["games"]) + " games) after 3Q: led " + str(counts["led"]) + ", tied " + str(counts["tied"]) + ", trailed " + str(counts["trailed"]))
@@ -15,6 +15,12 @@ class FileService(object):
         with open(filename, "a") as f:
             f.write(json.dumps(obj) + "\n")
 
+    @staticmethod
+    def append_all(filename:str, objs):
+        with open(filename, "a") as f:
+            for obj in objs:
+                f.write(json.dumps(obj) + "\n")
+
     @staticmethod
     def file_exists(filename:str) -> bool:
         #logger = AppLogger.get_logger()
@@ -66,6 +72,21 @@ class FileService(object):
                     
         return games_list
     
+    @staticmethod
+    def iter_file(filename: str):
+        # one record at a time, for inputs that shouldn't be held in memory
+        with open(filename, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    @staticmethod
+    def iter_all_files_in_directory(directory: str):
+        files = sorted(f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f)))
+        for f in files:
+            yield from FileService.iter_file(os.path.join(directory, f))
+
     @staticmethod
     def read_all_files_in_directory(directory: str):
         data_list = list()
@@ -1,9 +1,14 @@
 import re
 import os
+from functools import partial
 from datetime import datetime
 from src.logging.app_logger import AppLogger
 from src.api.request_utils import RequestUtils
 from src.service.file_service import FileService
+from src.service.map_reduce_runner import MapReduceRunner
+from src.service.sqlite_service import SqliteService
+from src.service.aggregate_service import AggregateService
+from src.service.records import GameRecord
 
 class FreethrowService(object):
     def __init__(self, config):
@@ -11,19 +16,67 @@ class FreethrowService(object):
         self.output_dir = config.get("output.data.dir")
         self.boxscore_data_file = config.get("boxscore.data.file")
         self.boxscore_data_path = os.path.join(self.output_dir, "boxscore")
-        self.team_id = config.get("team.id")
+        self.team_id = int(config.get("team.id"))
+        self.seasons = [season.strip() for season in config.get("seasons").split(",")]
 
         self.config = config
 
-    def analyze_close_game_ft_percentages(self, win_or_loss):
-        # collect the boxscore data
-        boxscore_list = FileService.read_all_files_in_directory(self.boxscore_data_path)
+    def season_ft_report(self):
+        # straight from the season rollups, nothing re-aggregated
+        aggregates = AggregateService(self.config)
+        for season in self.seasons:
+            rollup = aggregates.get(season, self.team_id)
+            if rollup is None:
+                continue
+            print(season + " FT-FTA: " + str(rollup["FT"]) + "-" + str(rollup["FTA"]) + " " + str(rollup["FT_pct"])
+                  + ", opponents " + str(rollup["opp_FT"]) + "-" + str(rollup["opp_FTA"]) + " " + str(rollup["opp_FT_pct"])
+                  + ", close games " + str(rollup.get("close_wins", 0)) + "-" + str(rollup.get("close_losses", 0)))
 
-        filtered_boxscore_list = self.filter_by_losses_or_wins(win_or_loss, 5, boxscore_list)
+    def analyze_close_game_ft_percentages(self, win_or_loss):
+        sqlite_service = SqliteService(self.config)
+        if sqlite_service.enabled:
+            # indexed lookup instead of scanning the season files
+            filtered_boxscore_list = GameRecord.decode_all(sqlite_service.close_games(self.team_id, 5, win_or_loss))
+            sqlite_service.close()
+            self.freethrow_analyis(filtered_boxscore_list, win_or_loss)
+            self.freethrow_totals(self.aggregate_free_throws(filtered_boxscore_list), win_or_loss)
+            return
+
+        # filter + aggregate each season's boxscore file in its own process
+        partitions = MapReduceRunner.file_partitions(self.boxscore_data_path)
+        filtered_boxscore_list, totals = MapReduceRunner(self.config).run(
+            partitions, partial(self.map_close_games, win_or_loss), self.reduce_close_games)
         #for bs in filtered_boxscore_list:
         #    self.logger.info(str(bs))
 
         self.freethrow_analyis(filtered_boxscore_list, win_or_loss)
+        self.freethrow_totals(totals, win_or_loss)
+
+    def map_close_games(self, win_or_loss, boxscore_file):
+        boxscore_list = GameRecord.decode_all(FileService.read_file(boxscore_file))
+        filtered = self.filter_by_losses_or_wins(win_or_loss, 5, boxscore_list)
+        return filtered, self.aggregate_free_throws(filtered)
+
+    def reduce_close_games(self, partials):
+        games = MapReduceRunner.merge_sorted([p[0] for p in partials], key=lambda bs: (str(bs.season), bs.game_date))
+        totals = MapReduceRunner.sum_counts([p[1] for p in partials])
+        return games, totals
+
+    def aggregate_free_throws(self, boxscore_list):
+        totals = {"games": 0, "FT": 0, "FTA": 0, "opp_FT": 0, "opp_FTA": 0}
+        for bs in boxscore_list:
+            if bs.side(self.team_id) == 1:
+                team, opponent = bs.homeTotals, bs.awayTotals
+            else:
+                team, opponent = bs.awayTotals, bs.homeTotals
+
+            totals["games"] += 1
+            totals["FT"] += team.FT
+            totals["FTA"] += team.FTA
+            totals["opp_FT"] += opponent.FT
+            totals["opp_FTA"] += opponent.FTA
+
+        return totals
 
 
     def filter_by_losses_or_wins(self, win_or_loss, point_diff, boxscore_list):
@@ -33,10 +86,10 @@ class FreethrowService(object):
             # for k,v in boxscore.items():
             #     self.logger.info(k + " -> " + str(v))
 
-            home_score = boxscore["homeTeam"]["PTS"]
-            away_score = boxscore["awayTeam"]["PTS"]
-            homeTeamId = boxscore["homeTeamId"]
-            awayTeamId = boxscore["awayTeamId"]
+            home_score = boxscore.homeTotals.PTS
+            away_score = boxscore.awayTotals.PTS
+            homeTeamId = boxscore.homeTeamId
+            awayTeamId = boxscore.awayTeamId
 
             if abs(home_score - away_score) > point_diff:
                 continue
@@ -61,22 +114,22 @@ class FreethrowService(object):
         for bs in boxscore_list:
             print("")
             #self.logger.info(str(bs))
-            game_date = bs["game_date"]
-            home_team = bs["homeTeam"]["team"]
-            home_team_pts = str(bs["homeTeam"]["PTS"])
-            homeTeam_ft = bs["homeTeam"]["FT"]
-            homeTeam_fta = bs["homeTeam"]["FTA"]
-            homeTeam_assists = bs["homeTeam"]["AST"]
-            homeTeam_turnovers = bs["homeTeam"]["TO"]
-
-            away_team = bs["awayTeam"]["team"]
-            away_team_pts = str(bs["awayTeam"]["PTS"])
-            awayTeam_ft = bs["awayTeam"]["FT"]
-            awayTeam_fta = bs["awayTeam"]["FTA"]
-            awayTeam_assists = bs["awayTeam"]["AST"]
-            awayTeam_turnovers = bs["awayTeam"]["TO"]
-
-            pt_diff = str(abs(bs["awayTeam"]["PTS"] - bs["homeTeam"]["PTS"]))
+            game_date = bs.game_date
+            home_team = bs.homeTotals.team
+            home_team_pts = str(bs.homeTotals.PTS)
+            homeTeam_ft = bs.homeTotals.FT
+            homeTeam_fta = bs.homeTotals.FTA
+            homeTeam_assists = bs.homeTotals.AST
+            homeTeam_turnovers = bs.homeTotals.TO
+
+            away_team = bs.awayTotals.team
+            away_team_pts = str(bs.awayTotals.PTS)
+            awayTeam_ft = bs.awayTotals.FT
+            awayTeam_fta = bs.awayTotals.FTA
+            awayTeam_assists = bs.awayTotals.AST
+            awayTeam_turnovers = bs.awayTotals.TO
+
+            pt_diff = str(abs(bs.awayTotals.PTS - bs.homeTotals.PTS))
 
             print(game_date + " "  + away_team + " at "  + home_team + ": Final Score: " + home_team_pts + "-" + away_team_pts)
 
@@ -87,7 +140,13 @@ class FreethrowService(object):
             #print(game_date + " " + home_team + " Assist/Turnover ratio: " + str(homeTeam_assists) + "/" + str(homeTeam_turnovers))
             #print(game_date + " " + away_team + " Assist/Turnover ratio: " + str(awayTeam_assists) + "/" + str(awayTeam_turnovers))
 
+    def freethrow_totals(self, totals, win_or_lose):
+        if not totals or totals["games"] == 0:
+            return
 
+        pct = totals["FT"] / totals["FTA"] if totals["FTA"] else 0.0
+        opp_pct = totals["opp_FT"] / totals["opp_FTA"] if totals["opp_FTA"] else 0.0
 
-
-
+        print("")
+        print(win_or_lose + " (" + str(totals["games"]) + " games) FT-FTA: " + str(totals["FT"]) + "-" + str(totals["FTA"]) + " " + f"{pct:.3f}")
+        print(win_or_lose + " (" + str(totals["games"]) + " games) opponent FT-FTA: " + str(totals["opp_FT"]) + "-" + str(totals["opp_FTA"]) + " " + f"{opp_pct:.3f}")
@@ -0,0 +1,162 @@
+import os
+import numpy as np
+from src.logging.app_logger import AppLogger
+from src.service.file_service import FileService
+from src.service.play_utils import PlayUtils
+
+class GameStateService(object):
+    # game index * KEY_SPAN + elapsed seconds gives one sorted key across all games
+    KEY_SPAN = 100000
+
+    def __init__(self, config):
+        self.logger = AppLogger.get_logger()
+        self.config = config
+
+        self.output_dir = config.get("output.data.dir")
+        self.playbyplay_data_path = os.path.join(self.output_dir, "playbyplay")
+
+        self.gamestate_data_path = os.path.join(self.output_dir, "gamestate")
+        os.makedirs(self.gamestate_data_path, exist_ok=True)
+        self.gamestate_file_path = os.path.join(self.gamestate_data_path, config.get("gamestate.data.file"))
+
+        self.columns = None
+        self.game_positions = None
+        self.keys = None
+
+    def build_game_state(self):
+        do_gamestate = self.config.get("do.gamestate")
+        if not do_gamestate or do_gamestate.strip().lower() != "y":
+            self.logger.info("not re-generating game state index")
+            return
+
+        games_list = [g for g in FileService.read_all_files_in_directory(self.playbyplay_data_path) if g["available"] == "Y"]
+        columns = PlayUtils.build_score_columns(
+            (game["gameId"], PlayUtils.read_playbyplay_file(game["playbyplay_file"])) for game in games_list
+        )
+
+        FileService.delete_file(self.gamestate_file_path)
+        np.savez(self.gamestate_file_path, **columns)
+        self.logger.info("game state index: " + str(len(columns["game_ids"])) + " games, " + str(len(columns["home"])) + " plays")
+
+        self.set_columns(columns)
+
+    def add_games(self, games_list):
+        # append newly finished games to the saved index without re-reading the rest
+        columns = PlayUtils.build_score_columns(
+            (game["gameId"], PlayUtils.read_playbyplay_file(game["playbyplay_file"])) for game in games_list if game["available"] == "Y"
+        )
+        if len(columns["game_ids"]) == 0:
+            return
+
+        if FileService.file_exists(self.gamestate_file_path):
+            self.load()
+            existing = self.columns
+            keep = ~np.isin(existing["game_ids"], columns["game_ids"])
+            if not keep.all():
+                # a re-added game replaces its old plays
+                lengths = np.diff(existing["offsets"])
+                play_keep = np.repeat(keep, lengths)
+                existing = {k: v[play_keep] for k, v in existing.items() if k not in ("game_ids", "offsets")}
+                existing["game_ids"] = self.columns["game_ids"][keep]
+                existing["offsets"] = np.concatenate(([0], np.cumsum(lengths[keep])))
+
+            merged = {k: np.concatenate((existing[k], columns[k])) for k in columns if k not in ("offsets",)}
+            merged["offsets"] = np.concatenate((existing["offsets"], existing["offsets"][-1] + columns["offsets"][1:]))
+            columns = merged
+
+        np.savez(self.gamestate_file_path, **columns)
+        self.set_columns(columns)
+
+    def load(self):
+        if self.columns is None:
+            with np.load(self.gamestate_file_path) as data:
+                self.set_columns({k: data[k] for k in data.files})
+        return self
+
+    def set_columns(self, columns):
+        self.columns = columns
+        offsets = columns["offsets"]
+        game_idx = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        # every lookup is a binary search, so elapsed must never go down within a game. a missing or
+        # unreadable clock reads as 0:00 left, i.e. the end of its period: a running minimum from the
+        # back pulls such a play down to the time of the play after it (games can't mix, each one's
+        # keys are below the next one's)
+        keys = game_idx * GameStateService.KEY_SPAN + columns["elapsed"]
+        self.keys = np.minimum.accumulate(keys[::-1])[::-1]
+        self.game_positions = {int(game_id): i for i, game_id in enumerate(columns["game_ids"])}
+
+    def game_ids(self):
+        return self.load().columns["game_ids"]
+
+    def scores_at(self, elapsed):
+        # score of every game at elapsed game seconds: one binary search per game, all at once
+        self.load()
+        offsets = self.columns["offsets"]
+        n_games = len(offsets) - 1
+        elapsed = np.broadcast_to(np.asarray(elapsed, dtype=np.float64), (n_games,))
+
+        idx = np.searchsorted(self.keys, np.arange(n_games) * GameStateService.KEY_SPAN + elapsed, side="right") - 1
+        before_first_play = idx < offsets[:-1]
+        idx = np.maximum(idx, 0)
+
+        home = np.where(before_first_play, 0, self.columns["home"][idx])
+        away = np.where(before_first_play, 0, self.columns["away"][idx])
+        return home, away
+
+    def score_at(self, game_id, elapsed):
+        self.load()
+        i = self.game_positions[int(game_id)]
+        start, end = self.columns["offsets"][i], self.columns["offsets"][i + 1]
+
+        idx = np.searchsorted(self.keys[start:end], i * GameStateService.KEY_SPAN + elapsed, side="right") - 1
+        if idx < 0:
+            return 0, 0
+        return int(self.columns["home"][start + idx]), int(self.columns["away"][start + idx])
+
+    def score_with_time_left(self, game_id, period:int, clock:str):
+        # e.g. score_with_time_left(gameId, 4, "5:00")
+        return self.score_at(game_id, PlayUtils.elapsed_seconds(period, clock))
+
+    def margin_every_minute(self, game_id):
+        self.load()
+        i = self.game_positions[int(game_id)]
+        end = self.columns["offsets"][i + 1] - 1
+        last_period = max(4, int(self.columns["period"][end]))
+        game_end = PlayUtils.period_start(last_period) + PlayUtils.period_length(last_period)
+
+        start = self.columns["offsets"][i]
+        minutes = np.arange(0, game_end + 1, 60, dtype=np.float64)
+        idx = np.searchsorted(self.keys[start:end + 1], i * GameStateService.KEY_SPAN + minutes, side="right") - 1
+        margins = self.columns["home"][start + np.maximum(idx, 0)] - self.columns["away"][start + np.maximum(idx, 0)]
+        return np.where(idx < 0, 0, margins)
+
+    def games_within(self, max_margin:int, seconds_left:int, period:int = 4):
+        # games within max_margin at any point in the last seconds_left of period (home - away margin)
+        self.load()
+        period_end = PlayUtils.period_start(period) + PlayUtils.period_length(period)
+        window_start = period_end - seconds_left
+
+        # each game's plays in (window_start, period_end] are one slice of the sorted keys
+        offsets = self.columns["offsets"]
+        n_games = len(offsets) - 1
+        base = np.arange(n_games) * GameStateService.KEY_SPAN
+        lo = np.searchsorted(self.keys, base + window_start, side="right")
+        hi = np.searchsorted(self.keys, base + period_end, side="right")
+        home, away = self.columns["home"], self.columns["away"]
+
+        # margin entering the window: the play just before the slice, 0-0 if the game had none yet
+        before = np.maximum(lo - 1, 0)
+        entering = np.where(lo > offsets[:-1], home[before].astype(np.int64) - away[before], 0)
+        close = np.abs(entering) <= max_margin
+
+        # then every play inside it, touching only the slices
+        lengths = hi - lo
+        window_idx = np.arange(lengths.sum()) + np.repeat(lo - np.cumsum(lengths) + lengths, lengths)
+        close_play = np.abs(home[window_idx].astype(np.int64) - away[window_idx]) <= max_margin
+        close |= np.bincount(np.repeat(np.arange(n_games), lengths), weights=close_play, minlength=n_games) > 0
+
+        # a game that never reached the period doesn't count
+        last_period = self.columns["period"][offsets[1:] - 1]
+        close &= last_period >= period
+
+        return self.columns["game_ids"][close]
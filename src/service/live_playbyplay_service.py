@@ -0,0 +1,256 @@
+import bisect
+import json
+import os
+import re
+import time
+from src.logging.app_logger import AppLogger
+from src.api.request_utils import RequestUtils
+from src.service.file_service import FileService
+from src.service.play_utils import PlayUtils
+
+class LivePlaybyplayService(object):
+    # tails an in-progress game: each poll only the plays not seen before are
+    # appended to the live file and folded into the running score state
+    STATE = re.compile(r'"state":"(pre|in|post)"')
+    # only the keys that carry a game id: the game strip's gid, the header's id and a competition's
+    # id; a bare "id" would also match every play's (long, numeric) id
+    GAME_ID = re.compile(r'(?:"gid"|"header":\{"id"|"competitions":\[\{"id"):"(\d+)"')
+
+    def __init__(self, config):
+        self.logger = AppLogger.get_logger()
+        self.config = config
+
+        self.espn_url = config.get("espn.url")
+        self.poll_seconds = int(config.get("live.poll.seconds") or 20)
+        # give up after this many polls in a row with nothing new
+        self.max_idle_polls = int(config.get("live.max.idle.polls") or 90)
+
+        self.output_dir = config.get("output.data.dir")
+        self.live_data_file = config.get("live.data.file")
+        self.live_data_path = os.path.join(self.output_dir, "live")
+        os.makedirs(self.live_data_path, exist_ok=True)
+
+    def tail(self, game_id):
+        url = self.espn_url + "playbyplay/_/gameId/" + str(game_id)
+        live_data_file_path = os.path.join(self.live_data_path, self.live_data_file.replace("GAMEID", str(game_id)))
+
+        tracker = PlayTracker()
+        state = RunningScoreState()
+        groups = PeriodGroups()
+
+        # pick up where an earlier run stopped
+        if FileService.file_exists(live_data_file_path):
+            for play in FileService.iter_file(live_data_file_path):
+                tracker.mark_seen(play)
+                state.update(play)
+            self.logger.info("live " + str(game_id) + ": resumed with " + str(tracker.count) + " plays")
+
+        idle_polls = 0
+        while True:
+            final = self.poll(url, str(game_id), live_data_file_path, tracker, state, groups)
+            if final is None:
+                idle_polls += 1
+            else:
+                idle_polls = 0
+
+            if final or idle_polls >= self.max_idle_polls:
+                break
+            time.sleep(self.poll_seconds)
+
+        self.logger.info("live " + str(game_id) + ": done, " + str(state.summary()))
+        return state
+
+    def poll(self, url, game_id, live_data_file_path, tracker, state, groups):
+        # True once the game is over, False when new plays came in, None when nothing did
+        page = RequestUtils(url, False).get_page()
+        text = page.text
+
+        # no DOM: find the playGrps JSON straight in the page text, decoding only the periods that changed
+        pbp_array = groups.decode(text) if "playGrps" in text else None
+        if pbp_array is None:
+            return None
+
+        new_plays = tracker.diff(pbp_array)
+        for play in new_plays:
+            state.update(play)
+
+        if new_plays:
+            FileService.append_all(live_data_file_path, new_plays)
+            self.logger.info("live: +" + str(len(new_plays)) + " plays, " + str(state.summary()))
+
+        if LivePlaybyplayService.game_state(text, game_id) == "post":
+            return True
+        return False if new_plays else None
+
+    @staticmethod
+    def game_state(text, game_id):
+        # pre / in / post from this game's own status: the state whose nearest game id key before it
+        # (the game strip, header or competition) is game_id, not another game's on the page's
+        # scoreboard. None if the page has no state for it
+        ids = [(m.start(), m.group(1)) for m in LivePlaybyplayService.GAME_ID.finditer(text)]
+        positions = [position for position, _ in ids]
+        for m in LivePlaybyplayService.STATE.finditer(text):
+            i = bisect.bisect_left(positions, m.start()) - 1
+            if i >= 0 and ids[i][1] == game_id:
+                return m.group(1)
+        return None
+
+
+class PeriodGroups(object):
+    # the decoded playGrps from the last poll, one list of plays per period. a poll re-decodes
+    # only the periods whose JSON text changed, normally just the one being played, instead
+    # of the whole game's plays every time
+
+    def __init__(self):
+        self.texts = list()
+        self.groups = list()
+
+    def decode(self, text):
+        texts = PlayUtils.playgrp_texts(text)
+        if texts is None:
+            return None
+
+        try:
+            groups = [self.groups[i] if i < len(self.texts) and self.texts[i] == group_text else json.loads(group_text)
+                      for i, group_text in enumerate(texts)]
+        except ValueError:
+            # a play text with "],[" in it splits a period in the wrong place: decode it all
+            groups = PlayUtils.extract_playgrps(text)
+            if groups is None:
+                return None
+            texts = [None] * len(groups)
+
+        self.texts, self.groups = texts, groups
+        return groups
+
+
+class PlayTracker(object):
+    # which plays have been ingested: a count per period plus the last play id,
+    # so a normal poll only slices off the tail of each period's array
+
+    def __init__(self):
+        self.period_counts = dict()
+        self.last_ids = dict()
+        self.seen_ids = set()
+        self.count = 0
+
+    @staticmethod
+    def play_key(play, period, index):
+        # ESPN's play sequence id when there is one, else (period, index)
+        if play.get("id") is not None:
+            return str(play["id"])
+        return str(period) + ":" + str(index)
+
+    def mark_seen(self, play):
+        period = play["_period"]
+        self.period_counts[period] = max(self.period_counts.get(period, 0), play["_index"] + 1)
+        self.last_ids[period] = play["_key"]
+        self.seen_ids.add(play["_key"])
+        self.count += 1
+
+    def diff(self, pbp_array):
+        new_plays = list()
+        for period_index, period_array in enumerate(pbp_array):
+            period = period_index + 1
+            seen = self.period_counts.get(period, 0)
+
+            if seen > 0 and (len(period_array) < seen or self.play_key(period_array[seen - 1], period, seen - 1) != self.last_ids.get(period)):
+                # plays were inserted or revised earlier in the period: fall back to the id set
+                candidates = range(len(period_array))
+            else:
+                candidates = range(seen, len(period_array))
+
+            for index in candidates:
+                play = period_array[index]
+                key = self.play_key(play, period, index)
+                if key in self.seen_ids:
+                    continue
+
+                play = dict(play)
+                play["_period"] = period
+                play["_index"] = index
+                play["_key"] = key
+                # a late insert behind plays already counted can't be replayed into the running score
+                play["_inserted"] = index < seen
+                self.mark_seen(play)
+                new_plays.append(play)
+
+            if len(period_array) > 0:
+                self.period_counts[period] = len(period_array)
+                self.last_ids[period] = self.play_key(period_array[-1], period, len(period_array) - 1)
+
+        return new_plays
+
+
+class RunningScoreState(object):
+    # the scoring-run / lead-change numbers, kept up to date one play at a time
+
+    def __init__(self):
+        self.home = 0
+        self.away = 0
+        self.last_sign = 0
+        self.lead_changes = 0
+        self.ties = 0
+        self.home_largest_lead = 0
+        self.away_largest_lead = 0
+        self.run_team = 0
+        self.run_points = 0
+        self.home_best_run = 0
+        self.away_best_run = 0
+        self.period = 1
+        self.clock = None
+
+    def update(self, play):
+        if play.get("_inserted"):
+            return
+
+        home = int(play.get("homeScore") or 0)
+        away = int(play.get("awayScore") or 0)
+        home_pts = max(home - self.home, 0)
+        away_pts = max(away - self.away, 0)
+        previous_margin = self.home - self.away
+
+        self.home, self.away = home, away
+        self.period = PlayUtils.play_period(play, self.period)
+        self.clock = PlayUtils.play_clock(play)
+
+        if home_pts or away_pts:
+            team = (1 if home_pts else 0) - (1 if away_pts else 0)
+            if team != 0 and team == self.run_team:
+                self.run_points += home_pts + away_pts
+            else:
+                self.run_team = team
+                self.run_points = home_pts + away_pts if team != 0 else 0
+
+            if self.run_team == 1:
+                self.home_best_run = max(self.home_best_run, self.run_points)
+            elif self.run_team == -1:
+                self.away_best_run = max(self.away_best_run, self.run_points)
+
+        margin = home - away
+        if margin == 0 and previous_margin != 0:
+            self.ties += 1
+
+        sign = (margin > 0) - (margin < 0)
+        if sign != 0:
+            if self.last_sign != 0 and sign != self.last_sign:
+                self.lead_changes += 1
+            self.last_sign = sign
+
+        self.home_largest_lead = max(self.home_largest_lead, margin)
+        self.away_largest_lead = max(self.away_largest_lead, -margin)
+
+    def summary(self):
+        return {
+            "period": self.period,
+            "clock": self.clock,
+            "homeScore": self.home,
+            "awayScore": self.away,
+            "lead_changes": self.lead_changes,
+            "ties": self.ties,
+            "home_largest_lead": self.home_largest_lead,
+            "away_largest_lead": self.away_largest_lead,
+            "home_best_run": self.home_best_run,
+            "away_best_run": self.away_best_run,
+            "current_run": str(self.run_points) + "-0 " + ("home" if self.run_team == 1 else "away" if self.run_team == -1 else ""),
+        }
@@ -0,0 +1,53 @@
+import heapq
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from src.logging.app_logger import AppLogger
+
+class MapReduceRunner(object):
+    # runs a filter-then-aggregate analysis one partition (season/team file) per process,
+    # then merges the partial results in partition order so the output never depends on scheduling.
+    # workers are spawned, not forked: a fork would copy the logging queue listener without its
+    # thread. a spawned worker has no log handlers either, so mappers must not log - anything
+    # worth reporting goes in the partial they return
+
+    def __init__(self, config):
+        self.logger = AppLogger.get_logger()
+        workers = config.get("analysis.workers")
+        self.workers = int(workers) if workers else (os.cpu_count() or 1)
+
+    @staticmethod
+    def file_partitions(directory:str):
+        # one partition per data file, e.g. boxscore_2024.json, in a stable order
+        return sorted(os.path.join(directory, f) for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f)))
+
+    def run(self, partitions, mapper, reducer=None):
+        partitions = list(partitions)
+        if len(partitions) == 0:
+            partials = []
+        elif self.workers <= 1 or len(partitions) == 1:
+            partials = [mapper(p) for p in partitions]
+        else:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(partitions)), mp_context=context) as pool:
+                # map() yields results in partition order regardless of which finishes first
+                partials = list(pool.map(mapper, partitions))
+
+        self.logger.info("map-reduce: " + str(len(partitions)) + " partitions, " + str(self.workers) + " workers")
+
+        if reducer is None:
+            return partials
+        return reducer(partials)
+
+    @staticmethod
+    def merge_sorted(partials, key):
+        # each partial list is sorted by key; ties keep partition order
+        return list(heapq.merge(*[sorted(p, key=key) for p in partials], key=key))
+
+    @staticmethod
+    def sum_counts(partials):
+        totals = dict()
+        for partial in partials:
+            for k, v in partial.items():
+                totals[k] = totals.get(k, 0) + v
+        return totals
@@ -0,0 +1,212 @@
+import os
+import re
+import numpy as np
+from src.logging.app_logger import AppLogger
+from src.service.file_service import FileService
+from src.service.play_utils import PlayUtils
+
+class PlayClassifier(object):
+    # play description -> small integer play type.
+    # all the patterns are alternatives of one compiled regex anchored at the start, so the
+    # first alternative that matches anywhere in the text wins: order below is priority order
+    OTHER, MADE_THREE, MISSED_THREE, MADE_LAYUP, MISSED_LAYUP, MADE_JUMPER, MISSED_JUMPER, MADE_FT, MISSED_FT, \
+        TEAM_REB, OFF_REB, DEF_REB, TURNOVER, STEAL, BLOCK, FOUL, SUBSTITUTION, TIMEOUT, JUMP_BALL, END_PERIOD = range(20)
+    NAMES = ("other", "made_three", "missed_three", "made_layup", "missed_layup", "made_jumper", "missed_jumper", "made_ft", "missed_ft",
+             "team_reb", "off_reb", "def_reb", "turnover", "steal", "block", "foul", "substitution", "timeout", "jump_ball", "end_period")
+
+    PATTERNS = (
+        (MADE_FT, r"\bmade free throw"),
+        (MISSED_FT, r"\bmissed free throw"),
+        (MADE_THREE, r"\bmade three point"),
+        (MISSED_THREE, r"\bmissed three point"),
+        (MADE_LAYUP, r"\bmade (?:layup|dunk|tip shot|two point tip)"),
+        (MISSED_LAYUP, r"\bmissed (?:layup|dunk|tip shot|two point tip)"),
+        (MADE_JUMPER, r"\bmade\b"),
+        (MISSED_JUMPER, r"\bmissed\b"),
+        (SUBSTITUTION, r"\benters the game\b"),
+        (TEAM_REB, r"\bteam rebound"),
+        (OFF_REB, r"\boffensive rebound"),
+        (DEF_REB, r"\bdefensive rebound"),
+        (TURNOVER, r"\bturnover"),
+        (STEAL, r"\bsteal\b"),
+        (BLOCK, r"\bblock\b"),
+        (FOUL, r"\bfoul\b"),
+        (TIMEOUT, r"\btimeout\b"),
+        (JUMP_BALL, r"\bjump ball\b"),
+        (END_PERIOD, r"\bend of (?:the )?(?:\d|game|period|quarter|half|overtime|ot)"),
+    )
+
+    COMBINED = re.compile("^(?:" + "|".join("(?P<c" + str(code) + ">.*?" + pattern + ")" for code, pattern in PATTERNS) + ")", re.IGNORECASE | re.DOTALL)
+
+    def __init__(self, cache_size:int = 200000):
+        self.cache = dict()
+        self.cache_size = cache_size
+        self.hits = 0
+
+    def classify(self, text) -> int:
+        if not text:
+            return PlayClassifier.OTHER
+
+        code = self.cache.get(text)
+        if code is not None:
+            self.hits += 1
+            return code
+
+        match = PlayClassifier.COMBINED.match(text)
+        code = int(match.lastgroup[1:]) if match else PlayClassifier.OTHER
+
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+        self.cache[text] = code
+        return code
+
+    def classify_batch(self, texts):
+        return np.fromiter((self.classify(t) for t in texts), dtype=np.int8)
+
+
+class PlayTypeService(object):
+    # every play of every game classified and stored column-wise (int8 codes, offsets per game),
+    # plus per-game possessions, pace, FT trips and shot mix for each team
+    SIDES = {"home": 1, "away": -1}
+
+    def __init__(self, config):
+        self.logger = AppLogger.get_logger()
+        self.config = config
+
+        self.output_dir = config.get("output.data.dir")
+        self.playbyplay_data_path = os.path.join(self.output_dir, "playbyplay")
+
+        self.playtypes_data_path = os.path.join(self.output_dir, "playtypes")
+        os.makedirs(self.playtypes_data_path, exist_ok=True)
+        self.playtypes_columns_file_path = os.path.join(self.playtypes_data_path, config.get("playtypes.columns.file") or "play_types.npz")
+        self.playtypes_data_file = config.get("playtypes.data.file") or "playtypes_YYYY.json"
+
+        self.classifier = PlayClassifier(int(config.get("playtypes.cache.size") or 200000))
+
+    def classify_playbyplay(self):
+        do_playtypes = self.config.get("do.playtypes")
+        if not do_playtypes or do_playtypes.strip().lower() != "y":
+            self.logger.info("not re-classifying play-by-play")
+            return
+
+        games_list = [g for g in FileService.read_all_files_in_directory(self.playbyplay_data_path) if g["available"] == "Y"]
+        columns = self.build_play_type_columns(
+            (game["gameId"], PlayUtils.read_playbyplay_file(game["playbyplay_file"])) for game in games_list
+        )
+        FileService.delete_file(self.playtypes_columns_file_path)
+        np.savez(self.playtypes_columns_file_path, **columns)
+
+        for f in os.listdir(self.playtypes_data_path):
+            if f.endswith(".json"):
+                FileService.delete_file(os.path.join(self.playtypes_data_path, f))
+        self.write_game_summaries(games_list, columns)
+
+        self.logger.info("play types: " + str(len(columns["codes"])) + " plays, " + str(len(self.classifier.cache)) + " distinct descriptions, "
+                         + str(self.classifier.hits) + " cache hits")
+
+    def build_play_type_columns(self, games):
+        # games: iterable of (gameId, pbp_array); same layout as PlayUtils.build_score_columns
+        game_ids = list()
+        offsets = [0]
+        texts, sides, periods, elapsed = list(), list(), list(), list()
+
+        for game_id, pbp_array in games:
+            if not pbp_array:
+                continue
+
+            count = 0
+            for period_index, period_array in enumerate(pbp_array):
+                for play in period_array:
+                    texts.append(play.get("text"))
+                    sides.append(PlayTypeService.SIDES.get(play.get("homeAway"), 0))
+                    period = PlayUtils.play_period(play, period_index + 1)
+                    periods.append(period)
+                    elapsed.append(PlayUtils.elapsed_seconds(period, PlayUtils.play_clock(play)))
+                    count += 1
+
+            if count == 0:
+                continue
+
+            game_ids.append(int(game_id))
+            offsets.append(offsets[-1] + count)
+
+        return {
+            "game_ids": np.array(game_ids, dtype=np.int64),
+            "offsets": np.array(offsets, dtype=np.int64),
+            "codes": self.classifier.classify_batch(texts),
+            "sides": np.array(sides, dtype=np.int8),
+            "period": np.array(periods, dtype=np.int16),
+            "elapsed": np.array(elapsed, dtype=np.float32),
+        }
+
+    def team_counts(self, columns):
+        # (games, 2, codes) play type counts, [:, 0] home and [:, 1] away, in one bincount
+        offsets = columns["offsets"]
+        n_games = len(offsets) - 1
+        n_codes = len(PlayClassifier.NAMES)
+        codes = columns["codes"].astype(np.int64)
+        sides = columns["sides"]
+        game_idx = np.repeat(np.arange(n_games), np.diff(offsets))
+
+        attributed = sides != 0
+        key = (game_idx * 2 + (sides == -1)) * n_codes + codes
+        counts = np.bincount(key[attributed], minlength=n_games * 2 * n_codes).reshape(n_games, 2, n_codes)
+
+        # a free throw trip starts at a free throw that doesn't continue the same team's previous one
+        # at the same clock; plays in between (subs and timeouts between FT 1 and FT 2) don't break it
+        is_ft = (codes == PlayClassifier.MADE_FT) | (codes == PlayClassifier.MISSED_FT)
+        ft = np.flatnonzero(is_ft)
+        previous, current = ft[:-1], ft[1:]
+        continues = np.zeros(len(codes), dtype=bool)
+        continues[current] = ((sides[previous] == sides[current]) & (game_idx[previous] == game_idx[current])
+                              & (columns["elapsed"][previous] == columns["elapsed"][current]))
+        trip_start = is_ft & ~continues & attributed
+        trips = np.bincount((game_idx * 2 + (sides == -1))[trip_start], minlength=n_games * 2).reshape(n_games, 2)
+
+        return counts, trips
+
+    def game_summaries(self, columns):
+        counts, trips = self.team_counts(columns)
+        c = PlayClassifier
+
+        fga = counts[:, :, [c.MADE_THREE, c.MISSED_THREE, c.MADE_LAYUP, c.MISSED_LAYUP, c.MADE_JUMPER, c.MISSED_JUMPER]].sum(axis=2)
+        fta = counts[:, :, c.MADE_FT] + counts[:, :, c.MISSED_FT]
+        possessions = fga - counts[:, :, c.OFF_REB] + counts[:, :, c.TURNOVER] + 0.44 * fta
+
+        # 40 minutes plus 5 per overtime
+        offsets = columns["offsets"]
+        last_period = np.maximum(np.maximum.reduceat(columns["period"], offsets[:-1]), 4) if len(offsets) > 1 else np.zeros(0)
+        minutes = 40 + 5 * (last_period - 4)
+        pace = possessions.mean(axis=1) * 40 / minutes
+
+        return counts, trips, fga, fta, possessions, pace
+
+    def write_game_summaries(self, games_list, columns):
+        games_by_id = {int(game["gameId"]): game for game in games_list}
+        counts, trips, fga, fta, possessions, pace = self.game_summaries(columns)
+
+        for i, game_id in enumerate(columns["game_ids"]):
+            game = games_by_id[int(game_id)]
+            teams = dict()
+            for side, name in enumerate(("home", "away")):
+                teams[name] = {n: int(counts[i, side, code]) for code, n in enumerate(PlayClassifier.NAMES) if code != PlayClassifier.OTHER}
+                teams[name].update({
+                    "FGA": int(fga[i, side]),
+                    "FTA": int(fta[i, side]),
+                    "ft_trips": int(trips[i, side]),
+                    "possessions": round(float(possessions[i, side]), 1),
+                })
+
+            record = {
+                "season": game["season"],
+                "game_date": game["game_date"],
+                "gameId": game["gameId"],
+                "homeTeamId": game["homeTeamId"],
+                "awayTeamId": game["awayTeamId"],
+                "pace": round(float(pace[i]), 1),
+                "home": teams["home"],
+                "away": teams["away"],
+            }
+
+            playtypes_data_file_path = os.path.join(self.playtypes_data_path, self.playtypes_data_file.replace("YYYY", str(game["season"])))
+            FileService.append(playtypes_data_file_path, record)
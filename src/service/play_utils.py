@@ -0,0 +1,147 @@
+import json
+import numpy as np
+from bs4 import BeautifulSoup
+from src.logging.app_logger import AppLogger
+
+class PlayUtils(object):
+    QUARTER_SECONDS = 600  # 4 x 10 minute quarters
+    OVERTIME_SECONDS = 300  # 5 minute overtimes
+
+    @staticmethod
+    def read_playbyplay_file(playbyplay_file:str):
+        with open(playbyplay_file, "r", encoding="utf8") as file:
+            soup = BeautifulSoup(file, "html.parser")
+
+            for script in soup.find_all("script"):
+                text = script.get_text(strip=True)
+
+                if 'playGrps' in text:
+                    return PlayUtils.extract_playgrps(text)
+
+        return None
+
+    @staticmethod
+    def extract_playgrps(text:str):
+        logger = AppLogger.get_logger()
+
+        try:
+            start_position = text.find("playGrps")
+            if start_position == -1:
+                logger.error("cannot locate playGrps")
+                return None
+
+            end_position = text.find("]]", start_position)
+            if end_position == -1:
+                logger.error("cannot find end_position")
+                return None
+
+            pbp_data = text[start_position:end_position+2]
+            pbp_data = pbp_data.replace('playGrps":', '')
+            return json.loads(pbp_data)
+        except Exception as e:
+            logger.error(str(e))
+            return None
+
+    @staticmethod
+    def playgrp_texts(text:str):
+        # the playGrps JSON split into one undecoded text per period, so a caller can decode
+        # only the periods that changed; same bounds as extract_playgrps
+        start_position = text.find('playGrps":')
+        if start_position == -1:
+            return None
+        end_position = text.find("]]", start_position)
+        if end_position == -1:
+            return None
+
+        body = text[start_position + len('playGrps":') + 1:end_position + 1]
+        if not body.startswith("["):
+            return None
+        return ["[" + group + "]" for group in body[1:-1].split("],[")]
+
+    @staticmethod
+    def flatten(pbp_array):
+        # playGrps is one array of plays per period
+        return [play for period_array in pbp_array for play in period_array]
+
+    @staticmethod
+    def clock_to_seconds(display_value) -> float:
+        # "9:45" above a minute, "45.3" inside the last minute
+        if not display_value:
+            return 0.0
+
+        tokens = str(display_value).strip().split(":")
+        try:
+            if len(tokens) == 2:
+                return int(tokens[0]) * 60 + float(tokens[1])
+            return float(tokens[0])
+        except ValueError:
+            return 0.0
+
+    @staticmethod
+    def period_length(period:int) -> int:
+        return PlayUtils.QUARTER_SECONDS if period <= 4 else PlayUtils.OVERTIME_SECONDS
+
+    @staticmethod
+    def period_start(period:int) -> int:
+        if period <= 4:
+            return (period - 1) * PlayUtils.QUARTER_SECONDS
+        return 4 * PlayUtils.QUARTER_SECONDS + (period - 5) * PlayUtils.OVERTIME_SECONDS
+
+    @staticmethod
+    def elapsed_seconds(period:int, display_value) -> float:
+        remaining = PlayUtils.clock_to_seconds(display_value)
+        return PlayUtils.period_start(period) + PlayUtils.period_length(period) - remaining
+
+    @staticmethod
+    def play_period(play, default:int) -> int:
+        period = play.get("period")
+        if isinstance(period, dict):
+            period = period.get("number")
+        try:
+            return int(period)
+        except (TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def play_clock(play):
+        clock = play.get("clock")
+        if isinstance(clock, dict):
+            return clock.get("displayValue")
+        return clock
+
+    @staticmethod
+    def build_score_columns(games):
+        # games: iterable of (gameId, pbp_array)
+        # every game's plays are laid end to end, offsets[i]:offsets[i+1] is game i
+        game_ids = list()
+        offsets = [0]
+        periods, elapsed, home, away = list(), list(), list(), list()
+
+        for game_id, pbp_array in games:
+            if not pbp_array:
+                continue
+
+            count = 0
+            for period_index, period_array in enumerate(pbp_array):
+                for play in period_array:
+                    period = PlayUtils.play_period(play, period_index + 1)
+                    periods.append(period)
+                    elapsed.append(PlayUtils.elapsed_seconds(period, PlayUtils.play_clock(play)))
+                    home.append(int(play.get("homeScore") or 0))
+                    away.append(int(play.get("awayScore") or 0))
+                    count += 1
+
+            if count == 0:
+                continue
+
+            game_ids.append(int(game_id))
+            offsets.append(offsets[-1] + count)
+
+        return {
+            "game_ids": np.array(game_ids, dtype=np.int64),
+            "offsets": np.array(offsets, dtype=np.int64),
+            "period": np.array(periods, dtype=np.int16),
+            "elapsed": np.array(elapsed, dtype=np.float64),
+            "home": np.array(home, dtype=np.int32),
+            "away": np.array(away, dtype=np.int32),
+        }
@@ -7,6 +7,11 @@ from bs4 import BeautifulSoup
 from src.logging.app_logger import AppLogger
 from src.api.request_utils import RequestUtils
 from src.service.file_service import FileService
+from src.service.play_utils import PlayUtils
+from src.service.records import EndQuarterScores, PlayArray
+from src.service.sqlite_service import SqliteService
+from src.service.stream_join import StreamJoin
+from src.service.aggregate_service import AggregateService
 
 class PlaybyplayService(object):
     def __init__(self, config):
@@ -23,7 +28,9 @@ class PlaybyplayService(object):
         # use the box score data to get home/away teams
         self.boxscore_data_file = config.get("boxscore.data.file")
         self.boxscore_data_path = os.path.join(self.output_dir, "boxscore")
-        self.boxscore_data = FileService.read_all_files_in_directory(self.boxscore_data_path)
+
+        # records held in memory per sorted run / sqlite batch while joining
+        self.join_chunk_size = int(config.get("join.chunk.size") or 5000)
 
         self.playbyplay_data_file = config.get("playbyplay.data.file")
         self.playbyplay_data_path = os.path.join(self.output_dir, "playbyplay")
@@ -37,101 +44,91 @@ class PlaybyplayService(object):
         
         FileService.delete_all_files_in_directory(self.playbyplay_data_path)
         
-        games_list = FileService.read_file(self.metadata_file_path)
-        for game in games_list:
-            season = game["season"]
-            playbyplay_data_file_path = os.path.join(self.playbyplay_data_path, self.playbyplay_data_file.replace("YYYY", str(season)))
+        sqlite_service = SqliteService(self.config)
+        sqlite_games = list()
+        game_ids = list()
+        aggregates = AggregateService(self.config)
+        aggregates.reset("playbyplay")
 
-            del game["boxscore_url"] # don't want in playbyplay file
-            del game["boxscore_file"] # don't want in playbyplay file
+        # metadata and boxscore records both ordered by (season, gameId) and merged as streams
+        games = StreamJoin.external_sort(FileService.iter_file(self.metadata_file_path), StreamJoin.game_key, self.join_chunk_size)
+        boxscores = StreamJoin.external_sort(FileService.iter_all_files_in_directory(self.boxscore_data_path), StreamJoin.game_key, self.join_chunk_size)
+
+        for game, boxscore in StreamJoin.merge_join(games, boxscores, StreamJoin.game_key):
+            if len(sqlite_games) >= self.join_chunk_size:
+                sqlite_service.write_playbyplay(sqlite_games)
+                sqlite_games = list()
 
-            #self.logger.info(str(game))
-            
-            boxscore = (list(filter(lambda x: x["game_date"] == game["game_date"], self.boxscore_data)))[0]
             #self.logger.info(str(boxscore))
-            if len(boxscore) == 0:
+            if boxscore is None:
                 self.logger.error("uh oh no boxscore")
                 sys.exit()
 
-            game["homeTeamId"] = boxscore["homeTeamId"]
-            game["awayTeamId"] = boxscore["awayTeamId"]
-            game["homeTeam"] = boxscore["homeTeam"]["team"]
-            game["awayTeam"] = boxscore["awayTeam"]["team"]
-            game["homeTeamPoints"] = boxscore["homeTeam"]["PTS"]
-            game["awayTeamPoints"] = boxscore["awayTeam"]["PTS"]
+            game = self.build_playbyplay_record(game, boxscore)
 
-            playbyplay_file = game["playbyplay_file"]
-            playbyplay_data = self.process_playbyplay_file(playbyplay_file)
+            playbyplay_data_file_path = os.path.join(self.playbyplay_data_path, self.playbyplay_data_file.replace("YYYY", str(game["season"])))
+            FileService.append(playbyplay_data_file_path, game)
+            sqlite_games.append(game)
+            game_ids.append(game["gameId"])
+            aggregates.apply_playbyplay(game)
 
-            if playbyplay_data is None:
-                game["available"] = "N"
-                FileService.append(playbyplay_data_file_path, game)
-                continue
+        sqlite_service.write_playbyplay(sqlite_games)
+        # the games table follows the boxscore files; only quarter scores are play-by-play's
+        sqlite_service.prune(game_ids, ("quarter_scores",))
+        sqlite_service.close()
+        aggregates.save()
 
-            game["available"] = "Y"
-            q1 = playbyplay_data[0]
-            q2 = playbyplay_data[1]
-            q3 = playbyplay_data[2]
-            q4 = playbyplay_data[3]
+    def write_game(self, record, aggregates):
+        # one newly completed game, as built by build_playbyplay_record, onto the existing season file;
+        # the caller saves aggregates once for however many games it writes
+        playbyplay_data_file_path = os.path.join(self.playbyplay_data_path, self.playbyplay_data_file.replace("YYYY", str(record["season"])))
+        FileService.append(playbyplay_data_file_path, record)
 
-            q1_home_team_score = q1[len(q1)-1]["homeScore"]
-            q1_away_team_score = q1[len(q1)-1]["awayScore"]
+        sqlite_service = SqliteService(self.config)
+        sqlite_service.write_playbyplay([record])
+        sqlite_service.close()
 
-            q2_home_team_score = q2[len(q2)-1]["homeScore"]
-            q2_away_team_score = q2[len(q2)-1]["awayScore"]
+        aggregates.apply_playbyplay(record)
 
-            q3_home_team_score = q3[len(q3)-1]["homeScore"]
-            q3_away_team_score = q3[len(q3)-1]["awayScore"]
+    def build_playbyplay_record(self, game, boxscore):
+        del game["boxscore_url"] # don't want in playbyplay file
+        del game["boxscore_file"] # don't want in playbyplay file
 
-            q4_home_team_score = q4[len(q4)-1]["homeScore"]
-            q4_away_team_score = q4[len(q4)-1]["awayScore"]
+        #self.logger.info(str(game))
 
-            
-            game["end_quarter_scores"] = {
-                "q1": {"q1_home_team_score": q1_home_team_score, "q1_away_team_score": q1_away_team_score},
-                "q2": {"q2_home_team_score": q2_home_team_score, "q2_away_team_score": q2_away_team_score},
-                "q3": {"q3_home_team_score": q3_home_team_score, "q3_away_team_score": q3_away_team_score},
-                "q4": {"q4_home_team_score": q4_home_team_score, "q4_away_team_score": q4_away_team_score},
-            }
+        game["homeTeamId"] = boxscore["homeTeamId"]
+        game["awayTeamId"] = boxscore["awayTeamId"]
+        game["homeTeam"] = boxscore["homeTeam"]["team"]
+        game["awayTeam"] = boxscore["awayTeam"]["team"]
+        game["homeTeamPoints"] = boxscore["homeTeam"]["PTS"]
+        game["awayTeamPoints"] = boxscore["awayTeam"]["PTS"]
 
-            #game["playbyplay"] = playbyplay_data # too much data for a season file
+        playbyplay_file = game["playbyplay_file"]
+        playbyplay_data = self.process_playbyplay_file(playbyplay_file)
 
-            FileService.append(playbyplay_data_file_path, game)
+        if playbyplay_data is None:
+            game["available"] = "N"
+            return game
+
+        plays = PlayArray.from_playgrps(playbyplay_data)
+        try:
+            end_quarter_scores = EndQuarterScores.from_plays(plays)
+        except ValueError as e:
+            # an empty or missing quarter: no end-of-quarter scores rather than wrong ones
+            self.logger.error(str(game["gameId"]) + ": " + str(e) + ", play-by-play marked unavailable")
+            game["available"] = "N"
+            return game
+
+        game["available"] = "Y"
+        game["end_quarter_scores"] = end_quarter_scores.to_dict()
+
+        #game["playbyplay"] = playbyplay_data # too much data for a season file
+
+        return game
 
     def process_playbyplay_file(self, playbyplay_file:str):
         #self.logger.info(playbyplay_file)
-        with open(playbyplay_file, "r", encoding="utf8") as file:
-            soup = BeautifulSoup(file, "html.parser")
-
-            for script in soup.find_all("script"):
-                text = script.get_text(strip=True)
-
-                if 'playGrps' in text:
-                    try:
-                        start_position = text.find("playGrps")
-                        if start_position == -1:
-                            self.logger.error("cannot locate playGrps")
-                            return None
-                        
-                        end_position = text.find("]]", start_position)
-                        if end_position == -1:
-                            self.logger.error("cannot find end_position")
-                            return None
-                        
-                        pbp_data = text[start_position:end_position+2]
-                        pbp_data = pbp_data.replace('playGrps":', '')  
-                        pbp_array = json.loads(pbp_data)
-
-                        # for quarter_array in pbp_array:
-                        #     for play in quarter_array:
-                        #         self.logger.info(str(play))
-                    except Exception as e:
-                        self.logger.error(str(e))
-                        return None
-
-                    return pbp_array
-                
-        return None
+        return PlayUtils.read_playbyplay_file(playbyplay_file)
         
         
     # def extract_home_away(self, soup):
@@ -0,0 +1,75 @@
+from array import array
+from src.service.file_service import FileService
+
+class PlayerTable(object):
+    # per-game player box score lines, stored column-wise in typed arrays
+    # and keyed by (gameId, playerId); on disk each line is one compact list in FIELDS order
+    STATS = ("MIN", "PTS", "FG", "FGA", "FG3", "FG3A", "FT", "FTA", "REB", "AST", "TO", "STL", "BLK", "OREB", "DREB", "PF")
+    FIELDS = ("season", "gameId", "teamId", "playerId", "player", "starter") + STATS
+
+    def __init__(self):
+        self.seasons = array("h")
+        self.game_ids = array("q")
+        self.team_ids = array("q")
+        self.player_ids = array("q")
+        self.starters = array("b")
+        self.stats = array("h")  # len(STATS) values per row
+        self.players = list()
+        self.index = dict()
+
+    def __len__(self):
+        return len(self.game_ids)
+
+    def add(self, season, game_id, team_id, player_id, player:str, starter:bool, stats):
+        key = (int(game_id), int(player_id))
+        if key in self.index:
+            return
+
+        self.index[key] = len(self.game_ids)
+        self.seasons.append(int(season))
+        self.game_ids.append(int(game_id))
+        self.team_ids.append(int(team_id))
+        self.player_ids.append(int(player_id))
+        self.starters.append(1 if starter else 0)
+        self.stats.extend(int(stats[s]) for s in PlayerTable.STATS)
+        self.players.append(player)
+
+    def add_row(self, row):
+        self.add(row[0], row[1], row[2], row[3], row[4], row[5], dict(zip(PlayerTable.STATS, row[6:])))
+
+    def row(self, i:int):
+        n = len(PlayerTable.STATS)
+        return [self.seasons[i], self.game_ids[i], self.team_ids[i], self.player_ids[i], self.players[i], self.starters[i]] + self.stats[i * n:(i + 1) * n].tolist()
+
+    def get(self, game_id, player_id):
+        i = self.index.get((int(game_id), int(player_id)))
+        if i is None:
+            return None
+        return dict(zip(PlayerTable.FIELDS, self.row(i)))
+
+    def rows_for_game(self, game_id):
+        game_id = int(game_id)
+        return [self.row(i) for i, g in enumerate(self.game_ids) if g == game_id]
+
+    def game_rows(self):
+        # gameId -> row indexes, one pass instead of a scan per game
+        rows = dict()
+        for i, g in enumerate(self.game_ids):
+            rows.setdefault(g, list()).append(i)
+        return rows
+
+    def stat(self, name:str):
+        # one stat column across every row
+        n = len(PlayerTable.STATS)
+        return self.stats[PlayerTable.STATS.index(name)::n]
+
+    def write(self, filename:str):
+        FileService.append_all(filename, (self.row(i) for i in range(len(self))))
+
+    @staticmethod
+    def read(filenames):
+        table = PlayerTable()
+        for filename in filenames:
+            for row in FileService.read_file(filename):
+                table.add_row(row)
+        return table
@@ -0,0 +1,183 @@
+import json
+import os
+import numpy as np
+from scipy.sparse import csr_matrix, identity, vstack
+from scipy.sparse.linalg import lsmr
+from src.logging.app_logger import AppLogger
+from src.service.file_service import FileService
+from src.service.records import GameRecord
+
+class RatingsService(object):
+    # opponent-adjusted offensive / defensive efficiency (points per 100 possessions) per season.
+    # each team-game is one row of a sparse least-squares system:
+    #     efficiency - league average = off[team] - def[opponent] + home * (1 home, -1 away)
+    # weighted by possessions and damped toward 0 (an average team). the last saved solution only
+    # seeds the iteration: the damping is written into the system as extra rows, so the answer is
+    # the same from any starting point and doesn't drift with run history
+
+    def __init__(self, config):
+        self.logger = AppLogger.get_logger()
+        self.config = config
+        self.seasons = [season.strip() for season in config.get("seasons").split(",")]
+
+        self.output_dir = config.get("output.data.dir")
+        self.boxscore_data_path = os.path.join(self.output_dir, "boxscore")
+        self.boxscore_data_file = config.get("boxscore.data.file")
+
+        self.ratings_data_file = config.get("ratings.data.file") or "ratings_YYYY.json"
+        self.ratings_data_path = os.path.join(self.output_dir, "ratings")
+        os.makedirs(self.ratings_data_path, exist_ok=True)
+
+        # ridge pull toward an average team, in games' worth of evidence
+        self.damp = float(config.get("ratings.damp") or 1.0)
+        self.tolerance = float(config.get("ratings.tolerance") or 1e-8)
+        # also solve cold after a warm start and warn if the two differ
+        check = config.get("ratings.check.warm.start")
+        self.check_warm_start = bool(check) and check.strip().lower() == "y"
+
+    def collect_ratings(self):
+        do_ratings = self.config.get("do.ratings")
+        if not do_ratings or do_ratings.strip().lower() != "y":
+            self.logger.info("not re-generating ratings")
+            return
+
+        for season in self.seasons:
+            self.rate_season(season)
+
+    @staticmethod
+    def possessions(team):
+        return team.FGA - team.OREB + team.TO + 0.44 * team.FTA
+
+    def season_games(self, season):
+        boxscore_data_file_path = os.path.join(self.boxscore_data_path, self.boxscore_data_file.replace("YYYY", str(season)))
+        if not FileService.file_exists(boxscore_data_file_path):
+            return list()
+        return [GameRecord.from_dict(d) for d in FileService.iter_file(boxscore_data_file_path)]
+
+    def rate_season(self, season, warm_start:bool = True):
+        games = self.season_games(season)
+        if not games:
+            self.logger.info("no boxscore games for " + str(season))
+            return None
+
+        previous = self.load(season) if warm_start else None
+        ratings = self.solve(games, previous)
+        if previous and self.check_warm_start:
+            drift = RatingsService.max_difference(ratings, self.solve(games))
+            if drift > 1e-3:
+                self.logger.warning("ratings " + str(season) + ": warm and cold solves differ by " + f"{drift:.5f}")
+        ratings["season"] = str(season)
+        self.save(season, ratings)
+        self.logger.info("ratings " + str(season) + ": " + str(len(ratings["teams"])) + " teams, " + str(ratings["games"]) + " games, "
+                         + str(ratings["iterations"]) + " iterations" + (" (warm start)" if previous else ""))
+        return ratings
+
+    def solve(self, games, previous=None):
+        team_ids = sorted({g.homeTeamId for g in games} | {g.awayTeamId for g in games})
+        position = {team_id: i for i, team_id in enumerate(team_ids)}
+        n_teams = len(team_ids)
+        home_column = 2 * n_teams
+
+        names = dict()
+        team, opponent, home, points, possessions = list(), list(), list(), list(), list()
+        for g in games:
+            names[g.homeTeamId] = g.homeTotals.team
+            names[g.awayTeamId] = g.awayTotals.team
+            # one possession count per game, the average of both sides' estimates
+            game_possessions = (RatingsService.possessions(g.homeTotals) + RatingsService.possessions(g.awayTotals)) / 2
+            if game_possessions <= 0:
+                continue
+            for t, o, h, totals in ((g.homeTeamId, g.awayTeamId, 1.0, g.homeTotals), (g.awayTeamId, g.homeTeamId, -1.0, g.awayTotals)):
+                team.append(position[t])
+                opponent.append(position[o])
+                home.append(h)
+                points.append(totals.PTS)
+                possessions.append(game_possessions)
+
+        team, opponent, home = np.array(team), np.array(opponent), np.array(home)
+        points, possessions = np.array(points, dtype=np.float64), np.array(possessions)
+        efficiency = 100.0 * points / possessions
+        league = 100.0 * points.sum() / possessions.sum()
+
+        # rows scaled by sqrt(possessions / average) so a long game counts for more
+        weight = np.sqrt(possessions / possessions.mean())
+        n_rows = len(team)
+        rows = np.repeat(np.arange(n_rows), 3)
+        cols = np.column_stack((team, n_teams + opponent, np.full(n_rows, home_column))).ravel()
+        vals = np.column_stack((weight, -weight, weight * home)).ravel()
+        A = csr_matrix((vals, (rows, cols)), shape=(n_rows, 2 * n_teams + 1))
+        b = weight * (efficiency - league)
+
+        x0 = np.zeros(2 * n_teams + 1)
+        if previous:
+            for team_id, r in previous["teams"].items():
+                i = position.get(int(team_id))
+                if i is not None:
+                    x0[i] = r["off"]
+                    x0[n_teams + i] = r["def"]
+            x0[home_column] = previous.get("home", 0.0)
+
+        # lsmr's own damp would pull toward x0, so the ridge rows go in the matrix instead:
+        # min ||A x - b||^2 + damp^2 ||x||^2 has one answer, whatever x0 is
+        n_columns = 2 * n_teams + 1
+        A_damped = vstack((A, self.damp * identity(n_columns, format="csr")), format="csr")
+        b_damped = np.concatenate((b, np.zeros(n_columns)))
+        x, istop, iterations = lsmr(A_damped, b_damped, atol=self.tolerance, btol=self.tolerance, maxiter=10 * n_columns, x0=x0)[:3]
+
+        off, defense = x[:n_teams], x[n_teams:home_column]
+        games_played = np.bincount(team, minlength=n_teams)
+        teams = dict()
+        for i, team_id in enumerate(team_ids):
+            teams[str(team_id)] = {
+                "team": names[team_id],
+                "games": int(games_played[i]),
+                "off": round(float(off[i]), 4),
+                "def": round(float(defense[i]), 4),
+                "adj_off": round(float(league + off[i]), 2),
+                "adj_def": round(float(league - defense[i]), 2),
+                "net": round(float(off[i] + defense[i]), 2),
+            }
+
+        return {
+            "games": len(games),
+            "league_efficiency": round(float(league), 2),
+            "home": round(float(x[home_column]), 4),
+            "iterations": int(iterations),
+            "teams": teams,
+        }
+
+    @staticmethod
+    def max_difference(ratings, other):
+        # largest off / def / home difference between two solutions of the same games
+        drift = abs(ratings["home"] - other["home"])
+        for team_id, r in ratings["teams"].items():
+            o = other["teams"][team_id]
+            drift = max(drift, abs(r["off"] - o["off"]), abs(r["def"] - o["def"]))
+        return drift
+
+    def ratings_file_path(self, season):
+        return os.path.join(self.ratings_data_path, self.ratings_data_file.replace("YYYY", str(season)))
+
+    def load(self, season):
+        ratings_file_path = self.ratings_file_path(season)
+        if not FileService.file_exists(ratings_file_path):
+            return None
+        with open(ratings_file_path, "r") as f:
+            return json.load(f)
+
+    def save(self, season, ratings):
+        # write then rename, so a reader never sees half a file
+        ratings_file_path = self.ratings_file_path(season)
+        with open(ratings_file_path + ".tmp", "w") as f:
+            json.dump(ratings, f)
+        os.replace(ratings_file_path + ".tmp", ratings_file_path)
+
+    def print_ratings(self, season, top:int = 25):
+        ratings = self.load(season)
+        if ratings is None:
+            return
+        ranked = sorted(ratings["teams"].items(), key=lambda item: item[1]["net"], reverse=True)
+        print("")
+        print(str(season) + " adjusted efficiency (league " + str(ratings["league_efficiency"]) + ", home " + f"{ratings['home']:+.2f}" + ")")
+        for rank, (team_id, r) in enumerate(ranked[:top], start=1):
+            print(f"{rank:>3} " + r["team"] + " (" + team_id + ") net " + f"{r['net']:+.2f}" + ", off " + str(r["adj_off"]) + ", def " + str(r["adj_def"]))
@@ -0,0 +1,168 @@
+from array import array
+from src.service.play_utils import PlayUtils
+
+class TeamTotals(object):
+    # one team's box score totals (the "homeTeam" / "awayTeam" dicts in the boxscore files)
+    STATS = ("PTS", "FG", "FGA", "FG3", "FG3A", "FT", "FTA", "REB", "AST", "TO", "STL", "BLK", "OREB", "DREB", "PF")
+    __slots__ = ("team",) + STATS
+
+    def __init__(self, team:str, *stats):
+        self.team = team
+        for name, value in zip(TeamTotals.STATS, stats):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["team"], *(d.get(s, 0) for s in TeamTotals.STATS))
+
+    def to_dict(self):
+        d = {"team": self.team}
+        for s in TeamTotals.STATS:
+            d[s] = getattr(self, s)
+        return d
+
+
+class EndQuarterScores(object):
+    # home and away score at the end of q1..q4, on disk as
+    # {"q1": {"q1_home_team_score": .., "q1_away_team_score": ..}, ...}
+    QUARTERS = ("q1", "q2", "q3", "q4")
+    __slots__ = ("home", "away")
+
+    def __init__(self, home, away):
+        self.home = tuple(home)
+        self.away = tuple(away)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(
+            (int(d[q][q + "_home_team_score"]) for q in EndQuarterScores.QUARTERS),
+            (int(d[q][q + "_away_team_score"]) for q in EndQuarterScores.QUARTERS),
+        )
+
+    @classmethod
+    def from_plays(cls, plays):
+        # the last play of each regulation period; ValueError if one of them has no plays
+        return cls((plays.end_score(p)[0] for p in range(1, 5)), (plays.end_score(p)[1] for p in range(1, 5)))
+
+    def to_dict(self):
+        return {
+            q: {q + "_home_team_score": self.home[i], q + "_away_team_score": self.away[i]}
+            for i, q in enumerate(EndQuarterScores.QUARTERS)
+        }
+
+    def margin(self, quarter:int):
+        # home - away after quarter 1..4
+        return self.home[quarter - 1] - self.away[quarter - 1]
+
+
+class GameRecord(object):
+    # one row of metadata.json, the boxscore files or the playbyplay files; a field
+    # that row type doesn't carry stays None and is left out on encode.
+    # ids are ints in memory and strings on disk
+    FIELDS = ("season", "game_date", "gameId", "boxscore_file", "boxscore_url", "playbyplay_url", "playbyplay_file",
+              "homeTeamId", "awayTeamId", "homeTeam", "awayTeam", "homeTeamPoints", "awayTeamPoints", "available")
+    INT_IDS = ("gameId", "homeTeamId", "awayTeamId")
+    __slots__ = FIELDS + ("homeTotals", "awayTotals", "end_quarter_scores")
+
+    def __init__(self, **fields):
+        for name in GameRecord.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_dict(cls, d):
+        record = cls.__new__(cls)
+        for name in GameRecord.FIELDS:
+            setattr(record, name, d.get(name))
+        for name in GameRecord.INT_IDS:
+            value = getattr(record, name)
+            if value is not None:
+                setattr(record, name, int(value))
+
+        # boxscore rows carry the totals under homeTeam / awayTeam, playbyplay rows just the names
+        record.homeTotals = record.awayTotals = None
+        if isinstance(record.homeTeam, dict):
+            record.homeTotals = TeamTotals.from_dict(record.homeTeam)
+            record.homeTeam = record.homeTotals.team
+        if isinstance(record.awayTeam, dict):
+            record.awayTotals = TeamTotals.from_dict(record.awayTeam)
+            record.awayTeam = record.awayTotals.team
+
+        scores = d.get("end_quarter_scores")
+        record.end_quarter_scores = EndQuarterScores.from_dict(scores) if scores else None
+        return record
+
+    def to_dict(self):
+        d = dict()
+        for name in GameRecord.FIELDS:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            d[name] = str(value) if name in GameRecord.INT_IDS else value
+
+        if self.homeTotals is not None:
+            d["homeTeam"] = self.homeTotals.to_dict()
+        if self.awayTotals is not None:
+            d["awayTeam"] = self.awayTotals.to_dict()
+        if self.end_quarter_scores is not None:
+            d["end_quarter_scores"] = self.end_quarter_scores.to_dict()
+        return d
+
+    @staticmethod
+    def decode_all(dicts):
+        return [GameRecord.from_dict(d) for d in dicts]
+
+    def side(self, team_id:int):
+        # 1 if team_id is home, -1 if away, 0 if it didn't play
+        if team_id == self.homeTeamId:
+            return 1
+        if team_id == self.awayTeamId:
+            return -1
+        return 0
+
+    def final_scores(self):
+        # home, away: from the totals on boxscore rows, the points fields on playbyplay rows
+        if self.homeTotals is not None:
+            return self.homeTotals.PTS, self.awayTotals.PTS
+        return self.homeTeamPoints, self.awayTeamPoints
+
+
+class PlayArray(object):
+    # one game's plays in typed columns instead of a list of dicts per period;
+    # period_offsets[p - 1]:period_offsets[p] are the plays of period p
+    __slots__ = ("period_offsets", "elapsed", "home", "away", "ids", "texts")
+
+    def __init__(self):
+        self.period_offsets = array("i", [0])
+        self.elapsed = array("i")
+        self.home = array("h")
+        self.away = array("h")
+        self.ids = list()
+        self.texts = list()
+
+    def __len__(self):
+        return len(self.elapsed)
+
+    @classmethod
+    def from_playgrps(cls, pbp_array):
+        plays = cls()
+        for period_index, period_array in enumerate(pbp_array):
+            period = period_index + 1
+            for play in period_array:
+                plays.elapsed.append(int(PlayUtils.elapsed_seconds(PlayUtils.play_period(play, period), PlayUtils.play_clock(play))))
+                plays.home.append(int(play.get("homeScore") or 0))
+                plays.away.append(int(play.get("awayScore") or 0))
+                plays.ids.append(play.get("id"))
+                plays.texts.append(play.get("text"))
+            plays.period_offsets.append(len(plays.elapsed))
+        return plays
+
+    def periods(self):
+        return len(self.period_offsets) - 1
+
+    def end_score(self, period:int):
+        # home, away after the last play of period; a period that is missing or has no plays
+        # raises rather than handing back another period's score
+        if period > self.periods() or self.period_offsets[period] == self.period_offsets[period - 1]:
+            raise ValueError("no plays in period " + str(period))
+        end = self.period_offsets[period] - 1
+        return self.home[end], self.away[end]
@@ -0,0 +1,145 @@
+import os
+import numpy as np
+from src.logging.app_logger import AppLogger
+from src.service.file_service import FileService
+from src.service.play_utils import PlayUtils
+
+class ScoringRunService(object):
+    def __init__(self, config):
+        self.logger = AppLogger.get_logger()
+        self.config = config
+
+        self.output_dir = config.get("output.data.dir")
+        self.playbyplay_data_path = os.path.join(self.output_dir, "playbyplay")
+
+        self.scoringruns_data_file = config.get("scoringruns.data.file")
+        self.scoringruns_data_path = os.path.join(self.output_dir, "scoringruns")
+        os.makedirs(self.scoringruns_data_path, exist_ok=True)
+
+        # a run of this many unanswered points or more gets counted
+        self.min_run_points = int(config.get("scoringruns.min.points") or 8)
+
+    def collect_scoring_runs(self):
+        do_scoringruns = self.config.get("do.scoringruns")
+        if not do_scoringruns or do_scoringruns.strip().lower() != "y":
+            self.logger.info("not re-generating scoring run files")
+            return
+
+        FileService.delete_all_files_in_directory(self.scoringruns_data_path)
+
+        games_list = [g for g in FileService.read_all_files_in_directory(self.playbyplay_data_path) if g["available"] == "Y"]
+        self.write_scoring_runs(games_list)
+
+    def write_scoring_runs(self, games_list):
+        games_by_id = {int(game["gameId"]): game for game in games_list}
+
+        columns = PlayUtils.build_score_columns(
+            (game["gameId"], PlayUtils.read_playbyplay_file(game["playbyplay_file"])) for game in games_list
+        )
+        runs = self.compute_scoring_runs(columns)
+
+        for i, game_id in enumerate(columns["game_ids"]):
+            game = games_by_id[int(game_id)]
+            record = {
+                "season": game["season"],
+                "game_date": game["game_date"],
+                "gameId": game["gameId"],
+                "homeTeamId": game["homeTeamId"],
+                "awayTeamId": game["awayTeamId"],
+                "homeTeam": game["homeTeam"],
+                "awayTeam": game["awayTeam"],
+                "scoring_runs": {k: v[i].item() for k, v in runs.items()}
+            }
+
+            scoringruns_data_file_path = os.path.join(self.scoringruns_data_path, self.scoringruns_data_file.replace("YYYY", str(game["season"])))
+            FileService.append(scoringruns_data_file_path, record)
+
+    def compute_scoring_runs(self, columns):
+        # all games at once: every step below is one array op over every play of every game
+        offsets = columns["offsets"]
+        n_games = len(offsets) - 1
+        if n_games == 0:
+            return dict()
+
+        home = columns["home"].astype(np.int64)
+        away = columns["away"].astype(np.int64)
+        elapsed = columns["elapsed"]
+
+        starts = offsets[:-1]
+        ends = offsets[1:] - 1
+        game_idx = np.repeat(np.arange(n_games), np.diff(offsets))
+
+        # points scored on each play, restarting from 0-0 at the top of every game
+        home_pts = np.diff(home, prepend=0)
+        away_pts = np.diff(away, prepend=0)
+        home_pts[starts] = home[starts]
+        away_pts[starts] = away[starts]
+        home_pts = np.clip(home_pts, 0, None)  # score corrections come through as negatives
+        away_pts = np.clip(away_pts, 0, None)
+
+        margin = home - away
+
+        # largest lead
+        max_margin = np.maximum.reduceat(margin, starts)
+        min_margin = np.minimum.reduceat(margin, starts)
+
+        # lead changes: the sign of the margin flips between consecutive non-tied plays
+        sign = np.sign(margin)
+        led = np.flatnonzero(sign != 0)
+        flipped = (sign[led[1:]] != sign[led[:-1]]) & (game_idx[led[1:]] == game_idx[led[:-1]])
+        lead_changes = np.bincount(game_idx[led[1:]][flipped], minlength=n_games)
+
+        # ties: the margin comes back to 0 from a lead
+        previous_margin = np.roll(margin, 1)
+        previous_margin[starts] = 0
+        tied = (margin == 0) & (previous_margin != 0)
+        ties = np.bincount(game_idx[tied], minlength=n_games)
+
+        # time spent in each state: a play's margin holds until the next play's clock
+        duration = np.zeros(len(elapsed))
+        duration[:-1] = np.diff(elapsed)
+        duration[ends] = 0
+        duration = np.clip(duration, 0, None)
+        home_leading_seconds = np.bincount(game_idx, weights=duration * (margin > 0), minlength=n_games)
+        away_leading_seconds = np.bincount(game_idx, weights=duration * (margin < 0), minlength=n_games)
+        tied_seconds = np.bincount(game_idx, weights=duration * (margin == 0), minlength=n_games)
+
+        # scoring runs: consecutive scoring plays by the same team
+        # 1 = home scored, -1 = away scored, 0 = both on one play (breaks any run)
+        events = np.flatnonzero((home_pts > 0) | (away_pts > 0))
+        event_team = (home_pts[events] > 0).astype(np.int64) - (away_pts[events] > 0).astype(np.int64)
+        event_points = home_pts[events] + away_pts[events]
+        event_game = game_idx[events]
+
+        new_run = np.ones(len(events), dtype=bool)
+        new_run[1:] = (event_team[1:] != event_team[:-1]) | (event_game[1:] != event_game[:-1])
+        run_id = np.cumsum(new_run) - 1
+        run_points = np.bincount(run_id, weights=event_points).astype(np.int64)
+        run_team = event_team[new_run]
+        run_game = event_game[new_run]
+
+        home_runs = run_team == 1
+        away_runs = run_team == -1
+
+        home_best_run = np.zeros(n_games, dtype=np.int64)
+        away_best_run = np.zeros(n_games, dtype=np.int64)
+        np.maximum.at(home_best_run, run_game[home_runs], run_points[home_runs])
+        np.maximum.at(away_best_run, run_game[away_runs], run_points[away_runs])
+
+        big_runs = run_points >= self.min_run_points
+        home_big_runs = np.bincount(run_game[home_runs & big_runs], minlength=n_games)
+        away_big_runs = np.bincount(run_game[away_runs & big_runs], minlength=n_games)
+
+        return {
+            "lead_changes": lead_changes,
+            "ties": ties,
+            "home_largest_lead": np.maximum(max_margin, 0),
+            "away_largest_lead": np.maximum(-min_margin, 0),
+            "home_leading_seconds": np.round(home_leading_seconds, 1),
+            "away_leading_seconds": np.round(away_leading_seconds, 1),
+            "tied_seconds": np.round(tied_seconds, 1),
+            "home_best_run": home_best_run,
+            "away_best_run": away_best_run,
+            "home_big_runs": home_big_runs,
+            "away_big_runs": away_big_runs,
+        }
@@ -1,5 +1,6 @@
 import re
 import os
+import time
 from datetime import datetime
 from src.logging.app_logger import AppLogger
 from src.api.request_utils import RequestUtils
@@ -45,52 +46,89 @@ class Scraper(object):
         FileService.delete_file(self.metadata_file_path)
         
         games = dict()
+        start = time.perf_counter()
+        requests_before = RequestUtils.stats["requests"]
 
         for season in self.seasons:
-            url = self.espn_url + self.season_results_url + str(season)
-            self.logger.info(url)
-            schedule_soup = RequestUtils(url, False).get_data()
-
-            scrape_schedule_file_path = os.path.join(self.output_dir, "scrape", "schedule", str(season), self.scrape_schedule_file.replace("YYYY", str(season)))
-            FileService.write_file(scrape_schedule_file_path, schedule_soup)
+            schedule_soup = self.scrape_schedule(season)
 
             # get game URLs
-            links = schedule_soup.select('td.Table__TD span.ml4[data-testid="link"] a.AnchorLink')
-            game_urls = [a["href"] for a in links]
-            for url in game_urls:
-                # get the game date
-                game_date_soup = RequestUtils(url, False).get_data()
-                game_date = self.extract_date(game_date_soup.get_text())
-
-                # collect the boxscore url page
-                gameId, boxscore_url = self.to_boxscore_url(url)
-                boxscore_soup = RequestUtils(boxscore_url, False).get_data()
-                boxscore_scrape_file_path = os.path.join(self.output_dir, "scrape", "boxscore", str(season), self.scrape_boxscore_file.replace("YYYYMMDD", str(game_date)))
-                if not FileService.file_exists(boxscore_scrape_file_path):
-                    FileService.write_file(boxscore_scrape_file_path, boxscore_soup)
-
-                # collect the play-by-play url page
-                # gameId already have
-                playbyplay_url = boxscore_url.replace("boxscore", "playbyplay")
-                playbyplay_soup = RequestUtils(playbyplay_url, False).get_data()
-                playbyplay_scrape_file_path = os.path.join(self.output_dir, "scrape", "playbyplay", str(season), self.scrape_playbyplay_file.replace("YYYYMMDD", str(game_date)))
-                if not FileService.file_exists(playbyplay_scrape_file_path):
-                    FileService.write_file(playbyplay_scrape_file_path, playbyplay_soup)
-
-                FileService.append(self.metadata_file_path, {
-                    "season": season,
-                    "game_date": game_date,
-                    "gameId": gameId,
-                    "boxscore_file": boxscore_scrape_file_path,
-                    "boxscore_url": boxscore_url,
-                    "playbyplay_url": playbyplay_url,
-                    "playbyplay_file": playbyplay_scrape_file_path
-                }
-    )
+            for url in self.game_urls(schedule_soup):
+                self.scrape_game(season, url)
                 
+        elapsed = time.perf_counter() - start
+        requests_made = RequestUtils.stats["requests"] - requests_before
+        self.logger.info("scrape: " + str(requests_made) + " requests in " + f"{elapsed:.1f}" + "s (" + f"{requests_made / elapsed if elapsed else 0:.2f}" + "/s), " + str(RequestUtils.stats["retries"]) + " retries")
+
         #return games
         return
     
+    def scrape_schedule(self, season):
+        url = self.espn_url + self.season_results_url + str(season)
+        self.logger.info(url, extra=AppLogger.SAMPLED)
+        schedule_page = RequestUtils(url, False).get_page()
+
+        scrape_schedule_file_name = self.scrape_schedule_file.replace("TEAMID", str(self.team_id)).replace("YYYY", str(season))
+        scrape_schedule_file_path = os.path.join(self.output_dir, "scrape", "schedule", str(season), scrape_schedule_file_name)
+        schedule_page.save(scrape_schedule_file_path)
+
+        # only the schedule page needs a DOM, for the game links
+        return schedule_page.soup
+
+    def game_urls(self, schedule_soup):
+        # completed games have a result link
+        links = schedule_soup.select('td.Table__TD span.ml4[data-testid="link"] a.AnchorLink')
+        return [a["href"] for a in links]
+
+    def scrape_game(self, season, url):
+        game = self.fetch_game(season, url)
+        FileService.append(self.metadata_file_path, game)
+        return game
+
+    def fetch_game(self, season, url):
+        # download the game's pages and return its metadata record, without writing metadata.json
+        # get the game date
+        game_date_soup = RequestUtils(url, False).get_data()
+        game_date = self.extract_date(game_date_soup.get_text())
+
+        # collect the boxscore url page
+        gameId, boxscore_url = self.to_boxscore_url(url)
+        boxscore_scrape_file_path = os.path.join(self.output_dir, "scrape", "boxscore", str(season), self.scrape_file_name(self.scrape_boxscore_file, game_date, gameId))
+        if not FileService.file_exists(boxscore_scrape_file_path):
+            RequestUtils(boxscore_url, False).download(boxscore_scrape_file_path)
+
+        # collect the play-by-play url page
+        # gameId already have
+        playbyplay_url = boxscore_url.replace("boxscore", "playbyplay")
+        playbyplay_scrape_file_path = os.path.join(self.output_dir, "scrape", "playbyplay", str(season), self.scrape_file_name(self.scrape_playbyplay_file, game_date, gameId))
+        if not FileService.file_exists(playbyplay_scrape_file_path):
+            RequestUtils(playbyplay_url, False).download(playbyplay_scrape_file_path)
+
+        game = {
+            "season": season,
+            "game_date": game_date,
+            "gameId": gameId,
+            "boxscore_file": boxscore_scrape_file_path,
+            "boxscore_url": boxscore_url,
+            "playbyplay_url": playbyplay_url,
+            "playbyplay_file": playbyplay_scrape_file_path
+        }
+        return game
+
+    def scrape_file_name(self, template:str, game_date, game_id):
+        return template.replace("YYYYMMDD", str(game_date)).replace("GAMEID", str(game_id))
+
+    @staticmethod
+    def check_file_names(config, team_ids):
+        # several teams share the scrape directories: a name without TEAMID / GAMEID would hand one
+        # team another team's schedule, or its same-day game pages
+        if len(team_ids) <= 1:
+            return
+        missing = [key + " needs " + token for key, token in (("scrape.schedule.file", "TEAMID"), ("scrape.boxscore.file", "GAMEID"), ("scrape.playbyplay.file", "GAMEID"))
+                   if token not in (config.get(key) or "")]
+        if missing:
+            raise ValueError(str(len(team_ids)) + " teams configured: " + ", ".join(missing))
+
     def to_boxscore_url(self, url):
         match = re.search(r'gameId/(\d+)', url)
         if not match:
@@ -0,0 +1,160 @@
+import os
+import numpy as np
+from src.logging.app_logger import AppLogger
+from src.service.file_service import FileService
+from src.service.records import GameRecord
+
+class SignificanceService(object):
+    # permutation tests and bootstrap confidence intervals for box score rates
+    # (made / attempted summed over games) split by close win/loss, margin bucket or state after 3Q.
+    # resamples are drawn batch_size at a time as (batch x games) matrices, never one at a time
+
+    METRICS = {"FT": ("FT", "FTA"), "FG": ("FG", "FGA"), "FG3": ("FG3", "FG3A")}
+    MARGIN_BUCKETS = ((1, 5, "1-5"), (6, 10, "6-10"), (11, 999, "11+"))
+
+    def __init__(self, config):
+        self.logger = AppLogger.get_logger()
+        self.config = config
+        self.team_id = int(config.get("team.id"))
+
+        self.output_dir = config.get("output.data.dir")
+        self.boxscore_data_path = os.path.join(self.output_dir, "boxscore")
+        self.playbyplay_data_path = os.path.join(self.output_dir, "playbyplay")
+
+        self.resamples = int(config.get("stats.resamples") or 100000)
+        self.batch_size = int(config.get("stats.batch.size") or 10000)
+        self.alpha = float(config.get("stats.alpha") or 0.05)
+        self.rng = np.random.default_rng(int(config.get("stats.seed") or 0))
+
+    def load_team_games(self, metric:str):
+        # one row per game for our team: made, attempts, final margin and margin after 3Q (nan when unknown)
+        made_key, attempts_key = SignificanceService.METRICS[metric]
+
+        q3_margins = dict()
+        for d in FileService.iter_all_files_in_directory(self.playbyplay_data_path):
+            pbp = GameRecord.from_dict(d)
+            if pbp.available == "Y":
+                q3_margins[pbp.gameId] = pbp.end_quarter_scores.margin(3)
+
+        made, attempts, margins, q3 = list(), list(), list(), list()
+        for d in FileService.iter_all_files_in_directory(self.boxscore_data_path):
+            bs = GameRecord.from_dict(d)
+            sign = bs.side(self.team_id)
+            if sign == 0:
+                continue
+            team, opponent = (bs.homeTotals, bs.awayTotals) if sign == 1 else (bs.awayTotals, bs.homeTotals)
+
+            made.append(getattr(team, made_key))
+            attempts.append(getattr(team, attempts_key))
+            margins.append(team.PTS - opponent.PTS)
+            q3_margin = q3_margins.get(bs.gameId)
+            q3.append(np.nan if q3_margin is None else sign * q3_margin)
+
+        return np.array(made, dtype=np.float64), np.array(attempts, dtype=np.float64), np.array(margins), np.array(q3, dtype=np.float64)
+
+    def analyze(self, metric:str = "FT"):
+        made, attempts, margins, q3 = self.load_team_games(metric)
+        if len(made) == 0:
+            self.logger.info("no games for team " + str(self.team_id))
+            return
+
+        close = np.abs(margins) <= 5
+        splits = [
+            ("close L vs all other games", close & (margins < 0), ~(close & (margins < 0))),
+            ("close L vs close W", close & (margins < 0), close & (margins > 0)),
+        ]
+        for low, high, name in SignificanceService.MARGIN_BUCKETS:
+            in_bucket = (np.abs(margins) >= low) & (np.abs(margins) <= high)
+            splits.append(("lost by " + name + " vs won by " + name, in_bucket & (margins < 0), in_bucket & (margins > 0)))
+        known = ~np.isnan(q3)
+        splits.append(("trailing after 3Q vs leading after 3Q", known & (q3 < 0), known & (q3 > 0)))
+
+        results = list()
+        for name, group_a, group_b in splits:
+            result = self.compare(made, attempts, group_a, group_b)
+            if result is None:
+                continue
+            result["split"] = name
+            result["metric"] = metric
+            results.append(result)
+            self.print_result(result)
+
+        return results
+
+    def compare(self, made, attempts, group_a, group_b):
+        # rate in A minus rate in B, with a permutation p-value and bootstrap intervals
+        if group_a.sum() == 0 or group_b.sum() == 0:
+            return None
+
+        in_either = group_a | group_b
+        made, attempts, labels = made[in_either], attempts[in_either], group_a[in_either]
+
+        rate_a = made[labels].sum() / attempts[labels].sum() if attempts[labels].sum() else np.nan
+        rate_b = made[~labels].sum() / attempts[~labels].sum() if attempts[~labels].sum() else np.nan
+        observed = rate_a - rate_b
+
+        p_value = self.permutation_test(made, attempts, labels, observed)
+        # the two groups are resampled independently; their difference reuses the same draws
+        rates_a = self.bootstrap_rates(made[labels], attempts[labels])
+        rates_b = self.bootstrap_rates(made[~labels], attempts[~labels])
+        ci_a = self.percentile_interval(rates_a)
+        ci_b = self.percentile_interval(rates_b)
+        ci_diff = self.percentile_interval(rates_a - rates_b)
+
+        return {
+            "games_a": int(labels.sum()), "games_b": int((~labels).sum()),
+            "rate_a": float(rate_a), "rate_b": float(rate_b), "difference": float(observed),
+            "p_value": float(p_value),
+            "ci_a": ci_a, "ci_b": ci_b, "ci_difference": ci_diff,
+        }
+
+    def batches(self):
+        remaining = self.resamples
+        while remaining > 0:
+            size = min(self.batch_size, remaining)
+            remaining -= size
+            yield size
+
+    def permutation_test(self, made, attempts, labels, observed):
+        # each row of a batch draws which games land in the smaller group: argpartition of
+        # random keys is a shuffle without moving the other n - k games around
+        small_is_a = labels.sum() <= (~labels).sum()
+        k = int(labels.sum() if small_is_a else (~labels).sum())
+        total_made, total_attempts = made.sum(), attempts.sum()
+
+        extreme = 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for size in self.batches():
+                idx = np.argpartition(self.rng.random((size, len(made)), dtype=np.float32), k - 1, axis=1)[:, :k]
+                made_small = made[idx].sum(axis=1)
+                attempts_small = attempts[idx].sum(axis=1)
+                rate_small = made_small / attempts_small
+                rate_rest = (total_made - made_small) / (total_attempts - attempts_small)
+                diff = rate_small - rate_rest if small_is_a else rate_rest - rate_small
+                extreme += np.count_nonzero(np.abs(diff) >= abs(observed) - 1e-12)
+
+        # two-sided, with the observed labelling counted as one of the permutations
+        return (extreme + 1) / (self.resamples + 1)
+
+    def bootstrap_rates(self, made, attempts):
+        # resampled games as index rows, batch x games
+        rates = list()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for size in self.batches():
+                idx = self.rng.integers(0, len(made), size=(size, len(made)), dtype=np.int32)
+                rates.append(made[idx].sum(axis=1) / attempts[idx].sum(axis=1))
+        return np.concatenate(rates)
+
+    def percentile_interval(self, values):
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return [None, None]
+        low, high = np.percentile(values, [100 * self.alpha / 2, 100 * (1 - self.alpha / 2)])
+        return [round(float(low), 4), round(float(high), 4)]
+
+    def print_result(self, r):
+        print("")
+        print(r["metric"] + " " + r["split"] + ": " + f"{r['rate_a']:.3f}" + " (" + str(r["games_a"]) + " games) vs "
+              + f"{r['rate_b']:.3f}" + " (" + str(r["games_b"]) + " games), difference " + f"{r['difference']:+.3f}")
+        print("  permutation p = " + f"{r['p_value']:.4f}" + ", " + str(int(100 * (1 - self.alpha))) + "% CI difference " + str(r["ci_difference"])
+              + ", A " + str(r["ci_a"]) + ", B " + str(r["ci_b"]))
@@ -0,0 +1,248 @@
+import os
+import sqlite3
+from src.logging.app_logger import AppLogger
+
+class SqliteService(object):
+    STATS = ("PTS", "FG", "FGA", "FG3", "FG3A", "FT", "FTA", "REB", "AST", "TO", "STL", "BLK", "OREB", "DREB", "PF")
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS games (
+            gameId INTEGER PRIMARY KEY,
+            season INTEGER NOT NULL,
+            game_date TEXT NOT NULL,
+            homeTeamId INTEGER NOT NULL,
+            awayTeamId INTEGER NOT NULL,
+            homeTeam TEXT,
+            awayTeam TEXT,
+            homePoints INTEGER,
+            awayPoints INTEGER,
+            margin INTEGER,
+            abs_margin INTEGER,
+            available TEXT
+        )""",
+        "CREATE TABLE IF NOT EXISTS team_totals (gameId INTEGER NOT NULL, teamId INTEGER NOT NULL, home INTEGER NOT NULL, team TEXT, "
+        + ", ".join('"' + s + '" INTEGER' for s in STATS) + ", PRIMARY KEY (gameId, teamId))",  # TO is a keyword, hence the quoting
+        """CREATE TABLE IF NOT EXISTS quarter_scores (
+            gameId INTEGER NOT NULL,
+            quarter INTEGER NOT NULL,
+            homeScore INTEGER,
+            awayScore INTEGER,
+            PRIMARY KEY (gameId, quarter)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_games_season ON games (season)",
+        "CREATE INDEX IF NOT EXISTS idx_games_home_team ON games (homeTeamId, season)",
+        "CREATE INDEX IF NOT EXISTS idx_games_away_team ON games (awayTeamId, season)",
+        "CREATE INDEX IF NOT EXISTS idx_games_date ON games (game_date)",
+        "CREATE INDEX IF NOT EXISTS idx_games_margin ON games (abs_margin)",
+        "CREATE INDEX IF NOT EXISTS idx_team_totals_team ON team_totals (teamId)",
+    ]
+
+    def __init__(self, config):
+        self.logger = AppLogger.get_logger()
+        self.config = config
+
+        store_sqlite = config.get("store.sqlite")
+        self.enabled = bool(store_sqlite) and store_sqlite.strip().lower() == "y"
+
+        self.output_dir = config.get("output.data.dir")
+        self.sqlite_file_path = os.path.join(self.output_dir, config.get("sqlite.file") or "wbb.sqlite")
+        self.connection = None
+
+    def connect(self):
+        if self.connection is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            self.connection = sqlite3.connect(self.sqlite_file_path)
+            self.connection.row_factory = sqlite3.Row
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            with self.connection:
+                for statement in SqliteService.SCHEMA:
+                    self.connection.execute(statement)
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def write_boxscores(self, games_list):
+        # one transaction for the whole batch
+        if not self.enabled or len(games_list) == 0:
+            return
+
+        game_rows, totals_rows = list(), list()
+        for game in games_list:
+            home, away = game["homeTeam"], game["awayTeam"]
+            game_rows.append((
+                int(game["gameId"]), int(game["season"]), game["game_date"],
+                int(game["homeTeamId"]), int(game["awayTeamId"]), home["team"], away["team"],
+                home["PTS"], away["PTS"], home["PTS"] - away["PTS"], abs(home["PTS"] - away["PTS"])
+            ))
+            for team_id, is_home, totals in ((game["homeTeamId"], 1, home), (game["awayTeamId"], 0, away)):
+                totals_rows.append((int(game["gameId"]), int(team_id), is_home, totals["team"]) + tuple(totals[s] for s in SqliteService.STATS))
+
+        connection = self.connect()
+        with connection:
+            connection.executemany(
+                """INSERT INTO games (gameId, season, game_date, homeTeamId, awayTeamId, homeTeam, awayTeam, homePoints, awayPoints, margin, abs_margin)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (gameId) DO UPDATE SET
+                       season=excluded.season, game_date=excluded.game_date, homeTeamId=excluded.homeTeamId, awayTeamId=excluded.awayTeamId,
+                       homeTeam=excluded.homeTeam, awayTeam=excluded.awayTeam, homePoints=excluded.homePoints, awayPoints=excluded.awayPoints,
+                       margin=excluded.margin, abs_margin=excluded.abs_margin""",
+                game_rows)
+            connection.executemany(
+                "INSERT OR REPLACE INTO team_totals (gameId, teamId, home, team, " + ", ".join('"' + s + '"' for s in SqliteService.STATS) + ") VALUES ("
+                + ", ".join("?" * (4 + len(SqliteService.STATS))) + ")",
+                totals_rows)
+
+        self.logger.info("sqlite: wrote " + str(len(game_rows)) + " box scores")
+
+    def write_playbyplay(self, games_list):
+        if not self.enabled or len(games_list) == 0:
+            return
+
+        available_rows, quarter_rows = list(), list()
+        for game in games_list:
+            available_rows.append((game["available"], int(game["gameId"])))
+            if game["available"] != "Y":
+                continue
+            for q in range(1, 5):
+                scores = game["end_quarter_scores"]["q" + str(q)]
+                quarter_rows.append((int(game["gameId"]), q, scores["q" + str(q) + "_home_team_score"], scores["q" + str(q) + "_away_team_score"]))
+
+        connection = self.connect()
+        with connection:
+            connection.executemany("UPDATE games SET available = ? WHERE gameId = ?", available_rows)
+            # a game whose play-by-play went away keeps no quarter scores from before
+            connection.executemany("DELETE FROM quarter_scores WHERE gameId = ?", [(game_id,) for available, game_id in available_rows if available != "Y"])
+            connection.executemany("INSERT OR REPLACE INTO quarter_scores (gameId, quarter, homeScore, awayScore) VALUES (?, ?, ?, ?)", quarter_rows)
+
+        self.logger.info("sqlite: wrote " + str(len(available_rows)) + " play-by-play summaries")
+
+    def prune(self, game_ids, tables=("games", "team_totals", "quarter_scores")):
+        # after a full rebuild of the data files: drop the rows of every game they no longer have
+        # (an earlier run's seasons or teams), so queries see the same games as the files
+        if not self.enabled:
+            return
+
+        connection = self.connect()
+        with connection:
+            connection.execute("CREATE TEMP TABLE IF NOT EXISTS keep_game_ids (gameId INTEGER PRIMARY KEY)")
+            connection.execute("DELETE FROM keep_game_ids")
+            connection.executemany("INSERT OR IGNORE INTO keep_game_ids (gameId) VALUES (?)", [(int(game_id),) for game_id in game_ids])
+            removed = dict()
+            for table in tables:
+                removed[table] = connection.execute("DELETE FROM " + table + " WHERE gameId NOT IN (SELECT gameId FROM keep_game_ids)").rowcount
+
+        self.logger.info("sqlite: pruned " + str(removed))
+
+    # queries
+
+    def game(self, game_id):
+        row = self.connect().execute("SELECT * FROM games WHERE gameId = ?", (int(game_id),)).fetchone()
+        return dict(row) if row else None
+
+    def games_for_team(self, team_id, seasons=None):
+        sql, params = self.team_filter(team_id, seasons)
+        return [dict(r) for r in self.connect().execute("SELECT * FROM games WHERE " + sql + " ORDER BY game_date", params)]
+
+    def games_between(self, start_date:str, end_date:str):
+        # dates are YYYYMMDD like game_date
+        rows = self.connect().execute("SELECT * FROM games WHERE game_date BETWEEN ? AND ? ORDER BY game_date", (start_date, end_date))
+        return [dict(r) for r in rows]
+
+    def close_game_filter(self, team_id, point_diff:int, win_or_loss=None, seasons=None):
+        # WHERE clause over the games columns for one team's close games
+        sql, params = self.team_filter(team_id, seasons)
+        sql = "abs_margin <= ? AND (" + sql + ")"
+        params = [point_diff] + params
+
+        team_id = int(team_id)
+        if win_or_loss == "L":
+            sql += " AND ((homeTeamId = ? AND margin < 0) OR (awayTeamId = ? AND margin > 0))"
+            params += [team_id, team_id]
+        elif win_or_loss == "W":
+            sql += " AND ((homeTeamId = ? AND margin > 0) OR (awayTeamId = ? AND margin < 0))"
+            params += [team_id, team_id]
+        return sql, params
+
+    def close_game_ids(self, team_id, point_diff:int, win_or_loss=None, seasons=None):
+        sql, params = self.close_game_filter(team_id, point_diff, win_or_loss, seasons)
+        return [r["gameId"] for r in self.connect().execute("SELECT gameId FROM games WHERE " + sql + " ORDER BY season, game_date", params)]
+
+    def close_games(self, team_id, point_diff:int, win_or_loss=None, seasons=None):
+        # same shape as the boxscore data file records
+        sql, params = self.close_game_filter(team_id, point_diff, win_or_loss, seasons)
+        return self.boxscore_records(sql, params)
+
+    def close_playbyplay_games(self, team_id, point_diff:int, win_or_loss=None, seasons=None):
+        # same shape as the playbyplay data file records, only games with play-by-play
+        sql, params = self.close_game_filter(team_id, point_diff, win_or_loss, seasons)
+        return self.playbyplay_records(sql + " AND available = 'Y'", params)
+
+    def boxscore_record(self, game_id):
+        records = self.boxscore_records("games.gameId = ?", [int(game_id)])
+        return records[0] if records else None
+
+    def playbyplay_record(self, game_id):
+        records = self.playbyplay_records("games.gameId = ?", [int(game_id)])
+        return records[0] if records else None
+
+    def boxscore_records(self, where:str, params):
+        # games and both teams' totals in one join, two rows per game, instead of a query per game
+        rows = self.connect().execute(
+            "SELECT games.gameId, games.season, games.game_date, games.homeTeamId, games.awayTeamId, t.home, t.team, "
+            + ", ".join('t."' + s + '"' for s in SqliteService.STATS)
+            + " FROM games JOIN team_totals t ON t.gameId = games.gameId WHERE " + where
+            + " ORDER BY games.season, games.game_date, games.gameId", params)
+
+        records = list()
+        for row in rows:
+            if not records or records[-1]["gameId"] != str(row["gameId"]):
+                records.append({
+                    "season": str(row["season"]),
+                    "game_date": row["game_date"],
+                    "gameId": str(row["gameId"]),
+                    "homeTeamId": str(row["homeTeamId"]),
+                    "awayTeamId": str(row["awayTeamId"]),
+                })
+            totals = {"team": row["team"]}
+            totals.update({s: row[s] for s in SqliteService.STATS})
+            records[-1]["homeTeam" if row["home"] else "awayTeam"] = totals
+        return records
+
+    def playbyplay_records(self, where:str, params):
+        # games and their quarter scores in one join, a row per quarter (one row if there are none)
+        rows = self.connect().execute(
+            "SELECT games.*, q.quarter, q.homeScore, q.awayScore FROM games LEFT JOIN quarter_scores q ON q.gameId = games.gameId WHERE " + where
+            + " ORDER BY games.season, games.game_date, games.gameId, q.quarter", params)
+
+        records = list()
+        for row in rows:
+            if not records or records[-1]["gameId"] != str(row["gameId"]):
+                records.append({
+                    "season": str(row["season"]),
+                    "game_date": row["game_date"],
+                    "gameId": str(row["gameId"]),
+                    "homeTeamId": str(row["homeTeamId"]),
+                    "awayTeamId": str(row["awayTeamId"]),
+                    "homeTeam": row["homeTeam"],
+                    "awayTeam": row["awayTeam"],
+                    "homeTeamPoints": row["homePoints"],
+                    "awayTeamPoints": row["awayPoints"],
+                    "available": row["available"] or "N",
+                })
+            if row["quarter"] is not None:
+                q = "q" + str(row["quarter"])
+                records[-1].setdefault("end_quarter_scores", dict())[q] = {q + "_home_team_score": row["homeScore"], q + "_away_team_score": row["awayScore"]}
+        return records
+
+    def team_filter(self, team_id, seasons=None):
+        # OR over the two team id indexes
+        sql = "(homeTeamId = ? OR awayTeamId = ?)"
+        params = [int(team_id), int(team_id)]
+        if seasons:
+            sql += " AND season IN (" + ", ".join("?" * len(seasons)) + ")"
+            params += [int(s) for s in seasons]
+        return sql, params
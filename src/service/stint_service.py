@@ -0,0 +1,234 @@
+import os
+import re
+import numpy as np
+from src.logging.app_logger import AppLogger
+from src.service.file_service import FileService
+from src.service.play_utils import PlayUtils
+from src.service.player_table import PlayerTable
+from src.service.records import GameRecord
+
+class StintService(object):
+    # rebuilds who was on the floor: starters from the player tables, then every
+    # "X enters the game for Y" play. a stint is one team's unbroken lineup over an
+    # interval of game time, with the points scored for and against over it
+    SUBSTITUTION = re.compile(r"^\s*(.+?) enters the game for (.+?)\.?\s*$")
+
+    def __init__(self, config):
+        self.logger = AppLogger.get_logger()
+        self.config = config
+
+        self.output_dir = config.get("output.data.dir")
+        self.playbyplay_data_path = os.path.join(self.output_dir, "playbyplay")
+        self.players_data_path = os.path.join(self.output_dir, "players")
+
+        self.stints_data_path = os.path.join(self.output_dir, "stints")
+        os.makedirs(self.stints_data_path, exist_ok=True)
+        self.stints_file_path = os.path.join(self.stints_data_path, config.get("stints.data.file") or "stints.npz")
+
+        self.index = None
+
+    def build_stints(self):
+        do_stints = self.config.get("do.stints")
+        if not do_stints or do_stints.strip().lower() != "y":
+            self.logger.info("not re-building lineup stints")
+            return
+
+        player_table = PlayerTable.read(sorted(os.path.join(self.players_data_path, f) for f in os.listdir(self.players_data_path)))
+        rows_by_game = player_table.game_rows()
+
+        stints = list()
+        unknown = 0
+        for d in FileService.read_all_files_in_directory(self.playbyplay_data_path):
+            game = GameRecord.from_dict(d)
+            if game.available != "Y" or game.gameId not in rows_by_game:
+                continue
+
+            rosters = self.rosters(player_table, rows_by_game[game.gameId])
+            pbp_array = PlayUtils.read_playbyplay_file(game.playbyplay_file)
+            if not pbp_array:
+                continue
+
+            game_stints, game_unknown = self.game_stints(game, rosters, pbp_array)
+            stints.extend(game_stints)
+            unknown += game_unknown
+
+        columns = StintService.to_columns(stints)
+        FileService.delete_file(self.stints_file_path)
+        np.savez(self.stints_file_path, **columns)
+        self.logger.info("lineup stints: " + str(len(stints)) + " stints, " + str(unknown) + " substitution names not on a roster")
+
+        self.index = StintIndex(columns)
+
+    def rosters(self, player_table, rows):
+        # teamId -> {"names": name -> playerId, "starters": [playerId, ...]}
+        rosters = dict()
+        for i in rows:
+            roster = rosters.setdefault(player_table.team_ids[i], {"names": dict(), "starters": list()})
+            roster["names"][player_table.players[i]] = player_table.player_ids[i]
+            if player_table.starters[i]:
+                roster["starters"].append(player_table.player_ids[i])
+        return rosters
+
+    def game_stints(self, game, rosters, pbp_array):
+        # (gameId, teamId, start, end, pts_for, pts_against, playerIds) for both teams
+        sides = {"home": game.homeTeamId, "away": game.awayTeamId}
+        lineups = {team_id: set(rosters.get(team_id, {"starters": []})["starters"]) for team_id in sides.values()}
+        opened = {team_id: (0.0, 0, 0) for team_id in sides.values()}
+
+        stints = list()
+        unknown = 0
+        elapsed, home, away = 0.0, 0, 0
+
+        def close(team_id):
+            start, start_home, start_away = opened[team_id]
+            home_pts, away_pts = home - start_home, away - start_away
+            pts_for, pts_against = (home_pts, away_pts) if team_id == game.homeTeamId else (away_pts, home_pts)
+            stints.append((game.gameId, team_id, start, elapsed, pts_for, pts_against, sorted(lineups[team_id])))
+            opened[team_id] = (elapsed, home, away)
+
+        for period_index, period_array in enumerate(pbp_array):
+            for play in period_array:
+                elapsed = PlayUtils.elapsed_seconds(PlayUtils.play_period(play, period_index + 1), PlayUtils.play_clock(play))
+                home = int(play.get("homeScore") or 0)
+                away = int(play.get("awayScore") or 0)
+
+                match = StintService.SUBSTITUTION.match(play.get("text") or "")
+                if not match:
+                    continue
+
+                player_in, player_out = match.group(1), match.group(2)
+                team_id = sides.get(play.get("homeAway"))
+                if team_id is None:
+                    # no side on the play: whichever roster has the player
+                    team_id = next((t for t in sides.values() if player_in in rosters.get(t, {"names": {}})["names"]), None)
+                if team_id is None or team_id not in rosters:
+                    unknown += 1
+                    continue
+
+                names = rosters[team_id]["names"]
+                if player_in not in names or player_out not in names:
+                    unknown += 1
+
+                # a batch of subs at one dead ball makes one lineup change, not several empty stints
+                start, start_home, start_away = opened[team_id]
+                if elapsed > start or (home, away) != (start_home, start_away):
+                    close(team_id)
+
+                lineups[team_id].discard(names.get(player_out))
+                if player_in in names:
+                    lineups[team_id].add(names[player_in])
+
+        for team_id in sides.values():
+            close(team_id)
+
+        return [s for s in stints if s[3] > s[2]], unknown
+
+    @staticmethod
+    def to_columns(stints):
+        # players are ragged (a bad sub line leaves 4 or 6), so flat ids plus offsets
+        player_offsets = np.zeros(len(stints) + 1, dtype=np.int64)
+        player_offsets[1:] = np.cumsum([len(s[6]) for s in stints])
+        return {
+            "game_ids": np.array([s[0] for s in stints], dtype=np.int64),
+            "team_ids": np.array([s[1] for s in stints], dtype=np.int64),
+            "start": np.array([s[2] for s in stints], dtype=np.float64),
+            "end": np.array([s[3] for s in stints], dtype=np.float64),
+            "pts_for": np.array([s[4] for s in stints], dtype=np.int32),
+            "pts_against": np.array([s[5] for s in stints], dtype=np.int32),
+            "player_offsets": player_offsets,
+            "player_ids": np.array([p for s in stints for p in s[6]], dtype=np.int64),
+        }
+
+    def load(self):
+        if self.index is None:
+            with np.load(self.stints_file_path) as data:
+                self.index = StintIndex({k: data[k] for k in data.files})
+        return self.index
+
+    def net_points(self, player_ids, without_ids=()):
+        return self.load().net_points(player_ids, without_ids)
+
+
+class StintIndex(object):
+    # per game, each team's stints sorted by start time for on-court lookups, and per team
+    # a bitset per player over that team's stints (bit k = k-th stint of the team), so
+    # "player set X on court" is an AND of a few ints instead of a rescan of every play
+
+    def __init__(self, columns):
+        self.columns = columns
+
+        order = np.lexsort((columns["start"], columns["team_ids"], columns["game_ids"]))
+        keys = np.stack((columns["game_ids"][order], columns["team_ids"][order]), axis=1)
+        self.intervals = dict()
+        if len(order):
+            boundaries = np.flatnonzero((keys[1:] != keys[:-1]).any(axis=1)) + 1
+            for rows in np.split(order, boundaries):
+                self.intervals[(int(columns["game_ids"][rows[0]]), int(columns["team_ids"][rows[0]]))] = rows
+
+        self.team_rows = dict()
+        self.player_bits = dict()
+        offsets = columns["player_offsets"]
+        for team_id in np.unique(columns["team_ids"]):
+            rows = np.flatnonzero(columns["team_ids"] == team_id)
+            self.team_rows[int(team_id)] = rows
+
+            positions = dict()
+            for k, row in enumerate(rows):
+                for player_id in columns["player_ids"][offsets[row]:offsets[row + 1]]:
+                    positions.setdefault(int(player_id), list()).append(k)
+
+            bits = dict()
+            for player_id, ks in positions.items():
+                mask = np.zeros(len(rows), dtype=bool)
+                mask[ks] = True
+                bits[player_id] = int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+            self.player_bits[int(team_id)] = bits
+
+    def players(self, row:int):
+        offsets = self.columns["player_offsets"]
+        return self.columns["player_ids"][offsets[row]:offsets[row + 1]].tolist()
+
+    def on_court(self, game_id, team_id, elapsed):
+        # playerIds on the floor for team_id at elapsed game seconds
+        rows = self.intervals.get((int(game_id), int(team_id)))
+        if rows is None:
+            return None
+        i = np.searchsorted(self.columns["start"][rows], elapsed, side="right") - 1
+        if i < 0 or self.columns["end"][rows[i]] < elapsed:
+            return None
+        return self.players(rows[i])
+
+    def stints_with(self, player_ids, without_ids=()):
+        # global stint rows where every one of player_ids was on and none of without_ids
+        player_ids = [int(p) for p in player_ids]
+        matched = list()
+        for team_id, bits in self.player_bits.items():
+            if not all(p in bits for p in player_ids):
+                continue
+
+            rows = self.team_rows[team_id]
+            mask = (1 << len(rows)) - 1
+            for p in player_ids:
+                mask &= bits[p]
+            for p in without_ids:
+                mask &= ~bits.get(int(p), 0)
+            if mask == 0:
+                continue
+
+            flags = np.unpackbits(np.frombuffer(mask.to_bytes((len(rows) + 7) // 8, "little"), dtype=np.uint8), bitorder="little")[:len(rows)]
+            matched.append(rows[flags.astype(bool)])
+
+        return np.concatenate(matched) if matched else np.zeros(0, dtype=np.int64)
+
+    def net_points(self, player_ids, without_ids=()):
+        rows = self.stints_with(player_ids, without_ids)
+        pts_for = int(self.columns["pts_for"][rows].sum())
+        pts_against = int(self.columns["pts_against"][rows].sum())
+        return {
+            "stints": int(len(rows)),
+            "games": int(len(np.unique(self.columns["game_ids"][rows]))),
+            "seconds": float((self.columns["end"][rows] - self.columns["start"][rows]).sum()),
+            "pts_for": pts_for,
+            "pts_against": pts_against,
+            "net": pts_for - pts_against,
+        }
@@ -0,0 +1,66 @@
+import heapq
+import json
+import os
+import tempfile
+from src.service.file_service import FileService
+
+class StreamJoin(object):
+    # sort-merge join over record streams: both sides are put in key order with a
+    # bounded-memory external sort, then walked together one record at a time
+
+    @staticmethod
+    def game_key(record):
+        return int(record["season"]), int(record["gameId"])
+
+    @staticmethod
+    def external_sort(records, key, chunk_size:int = 5000):
+        # sorted runs of chunk_size records go to temp files, then get k-way merged
+        run_files = list()
+        chunk = list()
+        try:
+            for record in records:
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    run_files.append(StreamJoin.write_run(chunk, key))
+                    chunk = list()
+
+            if len(run_files) == 0:
+                # everything fit in one chunk
+                chunk.sort(key=key)
+                yield from chunk
+                return
+
+            if chunk:
+                run_files.append(StreamJoin.write_run(chunk, key))
+                chunk = list()
+
+            yield from heapq.merge(*[FileService.iter_file(f) for f in run_files], key=key)
+        finally:
+            for f in run_files:
+                FileService.delete_file(f)
+
+    @staticmethod
+    def write_run(chunk, key) -> str:
+        chunk.sort(key=key)
+        fd, run_file = tempfile.mkstemp(prefix="join_run_", suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            for record in chunk:
+                f.write(json.dumps(record) + "\n")
+        return run_file
+
+    @staticmethod
+    def merge_join(left, right, key):
+        # left outer join of two key-sorted streams, right side unique per key:
+        # yields (left_record, right_record or None)
+        right = iter(right)
+        current = next(right, None)
+
+        for record in left:
+            k = key(record)
+            while current is not None and key(current) < k:
+                current = next(right, None)
+
+            if current is not None and key(current) == k:
+                yield record, current
+            else:
+                yield record, None
@@ -0,0 +1,175 @@
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from src.logging.app_logger import AppLogger
+from src.service.file_service import FileService
+from src.service.scraper import Scraper
+from src.service.boxscore_service import BoxscoreService
+from src.service.playbyplay_service import PlaybyplayService
+from src.service.scoring_run_service import ScoringRunService
+from src.service.game_state_service import GameStateService
+from src.service.ratings_service import RatingsService
+from src.service.aggregate_service import AggregateService
+
+class WatchService(object):
+    # long-running mode: polls the schedule pages and runs only newly final games through
+    # scrape -> boxscore -> playbyplay -> analysis outputs
+
+    def __init__(self, config):
+        self.logger = AppLogger.get_logger()
+        self.config = config
+
+        team_ids = config.get("watch.team.ids") or config.get("team.id")
+        self.team_ids = [t.strip() for t in team_ids.split(",") if t.strip()]
+        Scraper.check_file_names(config, self.team_ids)
+        self.season = [season.strip() for season in config.get("seasons").split(",")][-1]
+
+        self.idle_seconds = int(config.get("watch.poll.idle.seconds") or 1800)
+        self.active_seconds = int(config.get("watch.poll.active.seconds") or 120)
+        # a game is "on" from tip until this long after, when it could go final any minute
+        self.game_window = timedelta(hours=float(config.get("watch.game.window.hours") or 3))
+
+        self.output_dir = config.get("output.data.dir")
+        self.metadata_file_path = os.path.join(self.output_dir, config.get("metadata.file"))
+
+        # a row only shows its tip time until the game starts, so the times from earlier polls are
+        # kept: an in-progress game still counts as active after its row turns into a live score
+        self.tip_times = set()
+
+        self.known_game_ids = set()
+        if FileService.file_exists(self.metadata_file_path):
+            self.known_game_ids = {str(g["gameId"]) for g in FileService.iter_file(self.metadata_file_path)}
+
+    def watch(self):
+        do_watch = self.config.get("do.watch")
+        if not do_watch or do_watch.strip().lower() != "y":
+            self.logger.info("not watching")
+            return
+
+        self.logger.info("watching teams " + str(self.team_ids) + " for season " + str(self.season))
+        while True:
+            try:
+                wait = self.poll()
+            except Exception as e:
+                # keep the daemon alive through a bad page or a network blip
+                self.logger.error("watch poll failed: " + str(e))
+                wait = self.active_seconds
+
+            self.logger.info("next poll in " + str(wait) + "s")
+            time.sleep(wait)
+
+    def poll(self):
+        # returns how long to wait before the next poll
+        new_games = list()
+        # two watched teams playing each other list the same game on both schedules
+        seen_game_ids = set()
+
+        for team_id in self.team_ids:
+            scraper = Scraper(self.team_config(team_id))
+            schedule_soup = scraper.scrape_schedule(self.season)
+            self.tip_times.update(self.extract_tip_times(schedule_soup))
+
+            for url in scraper.game_urls(schedule_soup):
+                match = re.search(r'gameId/(\d+)', url)
+                if not match or match.group(1) in self.known_game_ids or match.group(1) in seen_game_ids:
+                    continue
+                seen_game_ids.add(match.group(1))
+
+                self.logger.info("new final: " + url)
+                try:
+                    new_games.append(scraper.fetch_game(self.season, url))
+                except Exception as e:
+                    # not known yet, so the next poll tries it again
+                    self.logger.error("scrape failed for " + url + ": " + str(e))
+
+        if new_games:
+            self.process_new_games(new_games)
+
+        now = datetime.now()
+        self.tip_times = {tip for tip in self.tip_times if tip + self.game_window >= now}
+        return self.next_wait(self.tip_times, now)
+
+    def team_config(self, team_id):
+        config = dict(self.config)
+        config["team.id"] = team_id
+        return config
+
+    def process_new_games(self, games):
+        boxscore_service = BoxscoreService(self.config)
+        playbyplay_service = PlaybyplayService(self.config)
+        aggregates = AggregateService(self.config)
+
+        # a game goes into metadata.json and known_game_ids only once its records are written;
+        # one that fails loses its scrape files, so the next poll downloads it again
+        playbyplay_records = list()
+        for game in games:
+            try:
+                player_tables = dict()
+                boxscore = boxscore_service.build_boxscore_record(dict(game), player_tables)
+                if boxscore is None:
+                    raise ValueError("no team totals")
+                playbyplay = playbyplay_service.build_playbyplay_record(dict(game), boxscore)
+
+                boxscore_service.write_game(boxscore, player_tables, aggregates)
+                playbyplay_service.write_game(playbyplay, aggregates)
+            except Exception as e:
+                self.logger.error("processing failed for " + str(game["gameId"]) + ": " + str(e))
+                FileService.delete_file(game["boxscore_file"])
+                FileService.delete_file(game["playbyplay_file"])
+                continue
+
+            # counters and applied ids for this game, before it counts as known
+            aggregates.save()
+            FileService.append(self.metadata_file_path, game)
+            self.known_game_ids.add(str(game["gameId"]))
+            playbyplay_records.append(playbyplay)
+
+        if not playbyplay_records:
+            return
+
+        # refresh the per-game analysis outputs for just these games
+        ScoringRunService(self.config).write_scoring_runs([r for r in playbyplay_records if r["available"] == "Y"])
+        GameStateService(self.config).add_games(playbyplay_records)
+
+        # re-rate from yesterday's solution, only a few iterations away
+        ratings_service = RatingsService(self.config)
+        for season in sorted({str(r["season"]) for r in playbyplay_records}):
+            ratings_service.rate_season(season)
+
+        self.logger.info("processed " + str(len(playbyplay_records)) + " new games")
+
+    def next_wait(self, tip_times, now):
+        # poll often while a game could be ending, otherwise idle until close to the next tip
+        wait = self.idle_seconds
+        for tip in tip_times:
+            if tip <= now <= tip + self.game_window:
+                return self.active_seconds
+            if tip > now:
+                wait = min(wait, max(self.active_seconds, int((tip - now).total_seconds())))
+        return wait
+
+    def extract_tip_times(self, schedule_soup):
+        # upcoming rows read like "Sun, Nov 3" ... "7:00 PM"; times are taken as local time
+        tip_times = list()
+        for row in schedule_soup.select("tr.Table__TR"):
+            cells = [td.get_text(strip=True) for td in row.select("td")]
+            if len(cells) < 3:
+                continue
+
+            date_match = re.match(r'\w{3}, (\w{3}) (\d{1,2})$', cells[0])
+            times = [c for c in cells[2:] if re.match(r'\d{1,2}:\d{2} [AP]M$', c)]
+            if not date_match or not times:
+                continue
+
+            try:
+                month_day = datetime.strptime(date_match.group(1) + " " + date_match.group(2), "%b %d")
+                clock = datetime.strptime(times[0], "%I:%M %p")
+            except ValueError:
+                continue
+
+            # season 2026 runs Nov 2025 - Apr 2026
+            year = int(self.season) - 1 if month_day.month >= 8 else int(self.season)
+            tip_times.append(datetime(year, month_day.month, month_day.day, clock.hour, clock.minute))
+
+        return tip_times
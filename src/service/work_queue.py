@@ -0,0 +1,202 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from src.logging.app_logger import AppLogger
+
+class WorkQueue(object):
+    # units of work in one sqlite file that every worker can open (a shared directory when
+    # the workers are on several machines). a worker leases a unit for lease_seconds;
+    # a lease that runs out is handed to the next worker that asks.
+    # unit ids are deterministic ("game:401725001"), so enqueueing twice is a no-op, and a
+    # result is committed at most once per unit even if two workers end up running it.
+    # reset() re-opens a finished unit, e.g. a schedule that has new games since the last run
+    PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS units (
+            unit_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            state TEXT NOT NULL,
+            worker TEXT,
+            token TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            seq INTEGER NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS results (
+            unit_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            result TEXT NOT NULL,
+            worker TEXT,
+            committed REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_units_state ON units (state, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_results_kind ON results (kind)",
+    ]
+
+    def __init__(self, config):
+        self.logger = AppLogger.get_logger()
+        self.config = config
+
+        self.output_dir = config.get("output.data.dir")
+        self.queue_file_path = os.path.join(self.output_dir, config.get("queue.file") or "work_queue.sqlite")
+        self.lease_seconds = float(config.get("queue.lease.seconds") or 300)
+        self.max_attempts = int(config.get("queue.max.attempts") or 3)
+        # coordinator / worker processes may be on several machines sharing the file over a network
+        # filesystem, where WAL's shared-memory index doesn't work: they use a rollback journal,
+        # which only needs the filesystem's file locks. local mode (one process) keeps WAL
+        mode = (config.get("distributed.mode") or "").strip().lower()
+        self.journal_mode = "DELETE" if mode in ("coordinator", "worker") else "WAL"
+        self.connection = None
+
+    def connect(self):
+        # one connection per thread / process: don't share a WorkQueue across threads
+        if self.connection is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            self.connection = sqlite3.connect(self.queue_file_path, timeout=30, isolation_level=None)
+            self.connection.row_factory = sqlite3.Row
+            self.connection.execute("PRAGMA journal_mode=" + self.journal_mode)
+            self.connection.execute("PRAGMA busy_timeout=30000")
+            for statement in WorkQueue.SCHEMA:
+                self.connection.execute(statement)
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers can't lease the same unit
+        connection = self.connect()
+        connection.execute("BEGIN IMMEDIATE")
+        return connection
+
+    def enqueue(self, units):
+        # units: (unit_id, kind, payload); returns how many were new
+        connection = self.transaction()
+        try:
+            added = self.insert_units(connection, units)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return added
+
+    def insert_units(self, connection, units):
+        added = 0
+        seq = connection.execute("SELECT COALESCE(MAX(seq), 0) FROM units").fetchone()[0]
+        for unit_id, kind, payload in units:
+            seq += 1
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO units (unit_id, kind, payload, state, seq) VALUES (?, ?, ?, ?, ?)",
+                (unit_id, kind, json.dumps(payload), WorkQueue.PENDING, seq))
+            added += cursor.rowcount
+        return added
+
+    def reset(self, unit_ids):
+        # finished units (done or failed) back to pending with a fresh attempt count, dropping
+        # their results so the next run's result and children are committed. units that are
+        # pending or leased are left alone. returns how many were reset
+        connection = self.transaction()
+        try:
+            reset = 0
+            for unit_id in unit_ids:
+                cursor = connection.execute(
+                    "UPDATE units SET state = ?, worker = NULL, token = NULL, lease_expires = NULL, attempts = 0, error = NULL WHERE unit_id = ? AND state IN (?, ?)",
+                    (WorkQueue.PENDING, unit_id, WorkQueue.DONE, WorkQueue.FAILED))
+                if cursor.rowcount == 1:
+                    connection.execute("DELETE FROM results WHERE unit_id = ?", (unit_id,))
+                    reset += 1
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return reset
+
+    def lease(self, worker:str, kinds=None):
+        # the oldest unit that is pending or whose lease ran out; None when there's nothing to do
+        now = time.time()
+        sql = "SELECT unit_id, kind, payload, attempts FROM units WHERE (state = ? OR (state = ? AND lease_expires < ?))"
+        params = [WorkQueue.PENDING, WorkQueue.LEASED, now]
+        if kinds:
+            sql += " AND kind IN (" + ", ".join("?" * len(kinds)) + ")"
+            params += list(kinds)
+        sql += " ORDER BY seq LIMIT 1"
+
+        connection = self.transaction()
+        try:
+            row = connection.execute(sql, params).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+
+            if row["attempts"] >= self.max_attempts:
+                # its last lease expired too: give up on it
+                connection.execute("UPDATE units SET state = ?, error = COALESCE(error, 'lease expired') WHERE unit_id = ?", (WorkQueue.FAILED, row["unit_id"]))
+                connection.execute("COMMIT")
+                return self.lease(worker, kinds)
+
+            token = uuid.uuid4().hex
+            connection.execute(
+                "UPDATE units SET state = ?, worker = ?, token = ?, lease_expires = ?, attempts = attempts + 1 WHERE unit_id = ?",
+                (WorkQueue.LEASED, worker, token, now + self.lease_seconds, row["unit_id"]))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        return {"unit_id": row["unit_id"], "kind": row["kind"], "payload": json.loads(row["payload"]), "token": token}
+
+    def complete(self, unit, worker:str, result, children=()):
+        # result and follow-on units in one transaction; a unit that already has a result
+        # (a slow worker whose lease was taken over) keeps the first one. True if this call committed
+        connection = self.transaction()
+        try:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO results (unit_id, kind, result, worker, committed) VALUES (?, ?, ?, ?, ?)",
+                (unit["unit_id"], unit["kind"], json.dumps(result), worker, time.time()))
+            committed = cursor.rowcount == 1
+            if committed:
+                self.insert_units(connection, children)
+            connection.execute("UPDATE units SET state = ?, lease_expires = NULL, error = NULL WHERE unit_id = ?", (WorkQueue.DONE, unit["unit_id"]))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return committed
+
+    def fail(self, unit, error:str):
+        # back in the queue for another try, unless it's out of attempts; only the current lease holder can do this
+        connection = self.transaction()
+        try:
+            connection.execute(
+                "UPDATE units SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, lease_expires = NULL, error = ? WHERE unit_id = ? AND token = ? AND state = ?",
+                (self.max_attempts, WorkQueue.FAILED, WorkQueue.PENDING, error[:2000], unit["unit_id"], unit["token"], WorkQueue.LEASED))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def counts(self):
+        rows = self.connect().execute("SELECT kind, state, COUNT(*) AS n FROM units GROUP BY kind, state")
+        counts = dict()
+        for row in rows:
+            counts.setdefault(row["kind"], dict())[row["state"]] = row["n"]
+        return counts
+
+    def open_units(self):
+        # pending or leased, i.e. not finished one way or the other
+        return self.connect().execute("SELECT COUNT(*) FROM units WHERE state IN (?, ?)", (WorkQueue.PENDING, WorkQueue.LEASED)).fetchone()[0]
+
+    def results(self, kind:str):
+        # in unit id order, so whatever is built from them doesn't depend on which worker finished first
+        for row in self.connect().execute("SELECT result FROM results WHERE kind = ? ORDER BY unit_id", (kind,)):
+            yield json.loads(row["result"])
+
+    def failures(self):
+        return [dict(row) for row in self.connect().execute("SELECT unit_id, kind, attempts, error FROM units WHERE state = ?", (WorkQueue.FAILED,))]